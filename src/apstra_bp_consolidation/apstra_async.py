@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+
+from apstra_bp_consolidation.apstra_session import CkApstraSession
+from apstra_bp_consolidation.apstra_blueprint import CkApstraBlueprint
+
+
+# asyncio twin of CkApstraSession
+class AsyncCkApstraSession:
+    """
+    Run the CkApstraSession calls from asyncio with a bounded number in flight.
+
+    The calls run in worker threads and share the pooled transport of the session,
+    so the concurrency should not exceed the pool size of the transport.
+
+    Example:
+        async_session = AsyncCkApstraSession(session, concurrency=8)
+        results = await asyncio.gather(*[async_session.get_items(x) for x in urls])
+    """
+
+    def __init__(self, session: CkApstraSession, concurrency: int = 8) -> None:
+        """
+        Initialize a AsyncCkApstraSession object.
+
+        Args:
+            session: The CkApstraSession to run the calls with.
+            concurrency: The maximum number of calls in flight.
+        """
+        self.session = session
+        self.concurrency = concurrency
+        self.url_prefix = session.url_prefix
+        self.logger = logging.getLogger('AsyncCkApstraSession')
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # the semaphore binds to the event loop. create one per loop (each asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run the blocking function in a worker thread within the concurrency limit.
+        """
+        async with self._get_semaphore():
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs):
+        return await self.run(self.session.request, method, url, **kwargs)
+
+    async def get_items(self, url: str) -> dict:
+        return await self.run(self.session.get_items, url)
+
+    async def patch_item(self, url: str, patch_spec: dict, params=None) -> dict:
+        return await self.run(self.session.patch_item, url, patch_spec, params=params)
+
+    async def patch_throttled(self, url: str, spec: dict, params=None) -> dict:
+        return await self.run(self.session.patch_throttled, url, spec, params)
+
+    async def get_device_profile(self, device_profile_name: str = None) -> dict:
+        return await self.run(self.session.get_device_profile, device_profile_name)
+
+    async def get_logical_device(self, id: int) -> dict:
+        return await self.run(self.session.get_logical_device, id)
+
+    async def list_blueprint_ids(self) -> list:
+        return await self.run(self.session.list_blueprint_ids)
+
+
+# asyncio twin of CkApstraBlueprint
+class AsyncCkApstraBlueprint:
+    """
+    The CkApstraBlueprint method surface as coroutines.
+
+    The calls share the concurrency limit of the AsyncCkApstraSession,
+    and the caches of the wrapped CkApstraBlueprint.
+
+    Example:
+        async_bp = await AsyncCkApstraBlueprint.create(async_session, 'ATLANTA-Master')
+        vn_list = await asyncio.gather(*[async_bp.get_virtual_network(x) for x in vni_list])
+    """
+
+    def __init__(self, async_session: AsyncCkApstraSession, blueprint: CkApstraBlueprint) -> None:
+        """
+        Initialize a AsyncCkApstraBlueprint object.
+
+        Args:
+            async_session: The AsyncCkApstraSession to run the calls with.
+            blueprint: The CkApstraBlueprint to wrap.
+        """
+        self.async_session = async_session
+        self.blueprint = blueprint
+        self.id = blueprint.id
+        self.label = blueprint.label
+        self.url_prefix = blueprint.url_prefix
+        self.logger = logging.getLogger(f"AsyncCkApstraBlueprint({self.label})")
+
+    @classmethod
+    async def create(cls, async_session: AsyncCkApstraSession, label: str, id: str = None):
+        """
+        Build the blueprint without blocking the event loop.
+        """
+        blueprint = await async_session.run(CkApstraBlueprint, async_session.session, label, id)
+        return cls(async_session, blueprint)
+
+    async def _run(self, func, *args, **kwargs):
+        return await self.async_session.run(func, *args, **kwargs)
+
+    async def query(self, query_string: str, print_prefix: str = None, multiline: bool = False, use_cache: bool = True,
+                    check_version: bool = False) -> list:
+        return await self._run(self.blueprint.query, query_string, print_prefix=print_prefix, multiline=multiline, use_cache=use_cache,
+                               check_version=check_version)
+
+    async def wait_for_query(self, query_string: str, predicate=None, multiline: bool = False, **kwargs) -> list:
+        return await self._run(self.blueprint.wait_for_query, query_string, predicate=predicate, multiline=multiline, **kwargs)
+
+    async def get_items(self, url: str) -> dict:
+        """
+        Get the items from the url under the blueprint.
+        """
+        return await self.async_session.get_items(f"blueprints/{self.id}/{url}")
+
+    async def get_system_node_from_label(self, system_label) -> dict:
+        return await self._run(self.blueprint.get_system_node_from_label, system_label)
+
+    async def get_server_interface_nodes(self, system_label, intf_name=None) -> list:
+        return await self._run(self.blueprint.get_server_interface_nodes, system_label, intf_name)
+
+    async def get_switch_interface_nodes(self, system_labels, intf_name=None) -> list:
+        return await self._run(self.blueprint.get_switch_interface_nodes, system_labels, intf_name)
+
+    async def get_transformation_id(self, system_label, intf_name, speed) -> int:
+        return await self._run(self.blueprint.get_transformation_id, system_label, intf_name, speed)
+
+    async def get_virtual_network(self, vni):
+        return await self._run(self.blueprint.get_virtual_network, vni)
+
+    async def get_interface_cts(self, interface_id) -> list:
+        return await self._run(self.blueprint.get_interface_cts, interface_id)
+
+    async def add_generic_system(self, gs_spec: dict) -> list:
+        return await self._run(self.blueprint.add_generic_system, gs_spec)
+
+    async def add_generic_systems(self, gs_specs: list, max_systems_per_request: int = 20) -> dict:
+        return await self._run(self.blueprint.add_generic_systems, gs_specs, max_systems_per_request)
+
+    async def add_single_vlan_ct(self, vni: str, is_tagged: bool) -> str:
+        return await self._run(self.blueprint.add_single_vlan_ct, vni, is_tagged)
+
+    async def add_single_vlan_cts(self, vni_tagged_pairs: list) -> dict:
+        return await self._run(self.blueprint.add_single_vlan_cts, vni_tagged_pairs)
+
+    async def patch_item(self, url: str, patch_spec: dict, params=None) -> dict:
+        return await self._run(self.blueprint.patch_item, url, patch_spec, params=params)
+
+    async def patch_leaf_server_link(self, link_spec: dict) -> None:
+        return await self._run(self.blueprint.patch_leaf_server_link, link_spec)
+
+    async def patch_obj_policy_batch_apply(self, policy_spec, params=None):
+        return await self._run(self.blueprint.patch_obj_policy_batch_apply, policy_spec, params=params)
+
+    async def patch_leaf_server_link_labels(self, spec, params=None, print_prefix=None):
+        return await self._run(self.blueprint.patch_leaf_server_link_labels, spec, params=params, print_prefix=print_prefix)
+
+    async def patch_node_single(self, node, patch_spec, params=None):
+        return await self._run(self.blueprint.patch_node_single, node, patch_spec, params=params)
+
+    async def patch_nodes(self, patch_spec, params=None):
+        return await self._run(self.blueprint.patch_nodes, patch_spec, params=params)
+
+    async def patch_virtual_network(self, patch_spec, params=None, svi_requirement=False):
+        return await self._run(self.blueprint.patch_virtual_network, patch_spec, params=params, svi_requirement=svi_requirement)
+
+    async def post_item(self, item_url, item_spec, params=None):
+        return await self._run(self.blueprint.post_item, item_url, item_spec, params=params)
+
+    async def post_tagging(self, nodes, tags_to_add=None, tags_to_remove=None, params=None, print_prefix=None):
+        return await self._run(self.blueprint.post_tagging, nodes, tags_to_add=tags_to_add, tags_to_remove=tags_to_remove, params=params, print_prefix=print_prefix)
+
+    async def batch(self, batch_spec: dict, params=None):
+        return await self._run(self.blueprint.batch, batch_spec, params=params)
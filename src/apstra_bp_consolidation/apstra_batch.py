@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import json
+import logging
+
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
+
+
+# accumulator of the /batch operations
+class CkBatchBuilder:
+    """
+    Accumulate the operations of a blueprint and send them in as few /batch requests as the limits allow.
+
+    The consecutive obj-policy-batch-apply operations are merged into one operation with many
+    application points. The operations run in the order added. It flushes when the next
+    operation would exceed max_operations or max_payload_bytes, and at the end of the with block.
+
+    Example:
+        with the_bp.batch_builder() as batch:
+            batch.add_policy_apply(interface_id, ct_id_list, used=False)
+            batch.add_delete_links(link_ids)
+        failed = batch.failed()
+    """
+    POLICY_APPLY_PATH = '/obj-policy-batch-apply'
+
+    def __init__(self, blueprint, max_operations: int = 50, max_payload_bytes: int = 1024 * 1024,
+                 max_policies_per_operation: int = 2000, params: dict = None) -> None:
+        """
+        Initialize a CkBatchBuilder object.
+
+        Args:
+            blueprint: The CkApstraBlueprint to run the batch.
+            max_operations: The maximum number of operations per /batch request.
+            max_payload_bytes: The maximum json size of a /batch request.
+            max_policies_per_operation: The maximum number of policies in an obj-policy-batch-apply operation.
+            params: The query parameters of /batch.
+        """
+        self.blueprint = blueprint
+        self.max_operations = max_operations
+        self.max_payload_bytes = max_payload_bytes
+        self.max_policies_per_operation = max_policies_per_operation
+        self.params = params or {'comment': 'batch-api'}
+        self.logger = logging.getLogger(f"CkBatchBuilder({blueprint.label})")
+
+        self.operations = []  # pending operations
+        self.payload_bytes = 0  # the estimated json size of the pending operations
+        self.policy_count = 0  # the policies in the last pending operation if it is obj-policy-batch-apply
+        self.results = []  # [ { path, method, status_code, result, application_points } ]
+        self.request_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    @staticmethod
+    def _size(data) -> int:
+        return len(json.dumps(data))
+
+    def _make_room(self, size: int, new_operation: bool) -> None:
+        over_count = new_operation and len(self.operations) >= self.max_operations
+        if self.operations and (over_count or self.payload_bytes + size > self.max_payload_bytes):
+            self.flush()
+
+    def add(self, path: str, method: str, payload) -> None:
+        """
+        Add an operation
+
+        Args:
+            path: The path under the blueprint. ex) /delete-switch-system-links
+            method: The http verb
+            payload: The payload of the operation
+        """
+        operation = {
+            'path': path,
+            'method': method,
+            'payload': payload,
+        }
+        self._make_room(self._size(operation), True)
+        self.operations.append(operation)
+        self.payload_bytes += self._size(operation)
+        self.policy_count = 0
+
+    def add_policy_apply(self, application_point_id: str, policies: list, used: bool = True) -> None:
+        """
+        Attach (used=True) or detach (used=False) the connectivity templates on an application point
+        """
+        self._add_policy_entries(application_point_id, [{'policy': x, 'used': used} for x in policies])
+
+    def add_policy_changes(self, application_point_id: str, attach: list = None, detach: list = None) -> None:
+        """
+        Attach and detach the connectivity templates on an application point in one entry
+        """
+        entries = [{'policy': x, 'used': True} for x in attach or []]
+        entries.extend({'policy': x, 'used': False} for x in detach or [])
+        self._add_policy_entries(application_point_id, entries)
+
+    def _add_policy_entries(self, application_point_id: str, entries: list) -> None:
+        entries = list(entries)
+        while entries:
+            room = self.max_policies_per_operation - self.policy_count if self._is_merging() else self.max_policies_per_operation
+            if room <= 0:
+                self._open_policy_apply()
+                continue
+            chunk = entries[:room]
+            del entries[:room]
+            application_point = {
+                'id': application_point_id,
+                'policies': chunk,
+            }
+            size = self._size(application_point)
+            if self._is_merging():
+                self._make_room(size, False)
+            if not self._is_merging():
+                self._open_policy_apply()
+            self.operations[-1]['payload']['application_points'].append(application_point)
+            self.payload_bytes += size
+            self.policy_count += len(chunk)
+
+    def _is_merging(self) -> bool:
+        return bool(self.operations) and self.operations[-1]['path'] == self.POLICY_APPLY_PATH
+
+    def _open_policy_apply(self) -> None:
+        self.add(self.POLICY_APPLY_PATH, 'PATCH', {'application_points': []})
+
+    def add_delete_links(self, link_ids: list) -> None:
+        """
+        Delete the switch system links
+        """
+        self.add('/delete-switch-system-links', 'POST', {'link_ids': list(link_ids)})
+
+    def add_node_patch(self, node_id: str, patch_spec: dict) -> None:
+        """
+        Patch a node
+        """
+        self.add(f"/nodes/{node_id}", 'PATCH', patch_spec)
+
+    def add_tagging(self, nodes: list, tags_to_add: list = None, tags_to_remove: list = None) -> None:
+        """
+        Add or remove the tags of the nodes
+        """
+        self.add('/tagging', 'POST', {
+            'add': tags_to_add or [],
+            'tags': [],
+            'nodes': list(nodes),
+            'remove': tags_to_remove or [],
+            'assigned_to_all': [],
+        })
+
+    def flush(self) -> list:
+        """
+        Send the pending operations in one /batch request
+
+        Returns:
+            The results of the sent operations
+        """
+        if not self.operations:
+            return []
+        operations = self.operations
+        self.operations = []
+        self.payload_bytes = 0
+        self.policy_count = 0
+        self.request_count += 1
+
+        self.logger.debug(f"sending {len(operations)} operations")
+        response = self.blueprint.batch({'operations': operations}, params=self.params)
+        try:
+            response_data = response.json() if response.content else {}
+        except ValueError:
+            response_data = {'text': response.text}
+        # the per-operation results if the controller returns them
+        operation_results = response_data.get('operations') if isinstance(response_data, dict) else None
+        if not isinstance(operation_results, list) or len(operation_results) != len(operations):
+            operation_results = [response_data] * len(operations)
+
+        results = []
+        for operation, operation_result in zip(operations, operation_results):
+            status_code = response.status_code
+            if isinstance(operation_result, dict):
+                status_code = operation_result.get('status_code', operation_result.get('code', status_code))
+            results.append({
+                'path': operation['path'],
+                'method': operation['method'],
+                'status_code': status_code,
+                'result': operation_result,
+                'application_points': [x['id'] for x in operation['payload']['application_points']] if operation['path'] == self.POLICY_APPLY_PATH else [],
+            })
+        if response.status_code >= 400:
+            self.logger.error("batch failed: status_code=%s, text=%s", response.status_code, CkLogPayload(response.text))
+        self.results.extend(results)
+        return results
+
+    def failed(self) -> list:
+        """
+        Return the results of the failed operations
+        """
+        return [x for x in self.results if not isinstance(x['status_code'], int) or x['status_code'] >= 400]
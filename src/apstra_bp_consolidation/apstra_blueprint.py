@@ -4,9 +4,16 @@
 import time
 import logging
 import uuid
+import functools
 
 from apstra_bp_consolidation.apstra_session import CkApstraSession
-from apstra_bp_consolidation.apstra_session import prep_logging
+from apstra_bp_consolidation.apstra_logging import prep_logging
+from apstra_bp_consolidation.apstra_graph import CkApstraGraph
+from apstra_bp_consolidation.apstra_graph import CkGraphUnsupported
+from apstra_bp_consolidation.apstra_query_cache import CkQueryCache
+from apstra_bp_consolidation.apstra_inventory import CkSystemInventory
+from apstra_bp_consolidation.apstra_batch import CkBatchBuilder
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
 
 # def pretty_yaml(data: dict, label: str) -> None:
 #     print(f"==== {label}\n{yaml.dump(data)}\n====")
@@ -24,6 +31,28 @@ class CkEnum:
     UNTAGGED_VLAN = 'untagged-vlan'
     REDUNDANCY_GROUP = 'redundancy-group'    
 
+def writes_blueprint(method=None, *, keeps_inventory: bool = False):
+    '''
+    Decorate the methods writing to the blueprint, to drop the local data after the write
+
+    Args:
+        keeps_inventory: The method keeps the inventory current by itself. It is dropped anyway on an exception.
+    '''
+    if method is None:
+        return functools.partial(writes_blueprint, keeps_inventory=keeps_inventory)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            result = method(self, *args, **kwargs)
+        except BaseException:
+            self._on_write()
+            raise
+        self._on_write(keeps_inventory=keeps_inventory)
+        return result
+    return wrapper
+
+
 class CkApstraBlueprint:
 
     def __init__(self, session: CkApstraSession, label: str, id: str = None) -> None:
@@ -33,20 +62,22 @@ class CkApstraBlueprint:
         Args:
             session: The Apstra session object.
             label: The label of the blueprint.
+            id: The id of the blueprint. The label is ignored if given.
         """
         self.session = session
         self.label = label
         self.id = id
-        if id:
-            this_blueprint = self.session.get_items(f"blueprints/{id}")
-            self.label = this_blueprint['label']
-        else:
-            self.get_id()
+        # the metadata comes from the cached listing. the graph is pulled only when needed
+        self.get_id()
         self.url_prefix = f"{self.session.url_prefix}/blueprints/{self.id}"
-        self.logger = logging.getLogger(f"CkApstraBlueprint({label})")
-
-        self.system_label_2_id_cache = {} # { system_label: { id: id, interface_map_id: id, device_profile_id: id }
-        self.system_id_2_label_cache = {} # { system_label: { id: id, interface_map_id: id, device_profile_id: id }
+        self.logger = logging.getLogger(f"CkApstraBlueprint({self.label})")
+
+        self.inventory = CkSystemInventory(self) # all the systems by label and id
+        self.graph = None # local snapshot of the blueprint graph from load_graph()
+        self.query_cache = CkQueryCache()
+        self.version_ttl = 5.0 # seconds to trust the staging version without asking the controller
+        self.staging_version = None
+        self.staging_version_at = 0.0
         self.logger.debug(f"{self.id=}")
 
     def get_id(self) -> str:
@@ -56,13 +87,12 @@ class CkApstraBlueprint:
         Returns:
             The ID of the blueprint.
         """
-        blueprints = self.session.get_items('blueprints')['items']
-        for blueprint in blueprints:
-            if blueprint['label'] == self.label:
-                self.id = blueprint['id']
-                break
-        if self.id is None:
-            raise ValueError(f"Blueprint '{self.label}' not found.")
+        summary = self.session.get_blueprint_summary(id=self.id, label=self.label)
+        if summary is None:
+            raise ValueError(f"Blueprint '{self.id or self.label}' not found.")
+        self.id = summary['id']
+        self.label = summary['label']
+        self.design = summary.get('design')
         return self.id
 
     # def get_id(self) -> None:
@@ -71,13 +101,128 @@ class CkApstraBlueprint:
     #     """
     #     return self.id
 
-    def query(self, query_string: str, print_prefix: str = None, multiline: bool = False) -> list:
+    def load_graph(self) -> CkApstraGraph:
+        """
+        Pull the blueprint graph once into the local snapshot.
+        The queries are evaluated locally until drop_graph() or a write through this blueprint.
+        """
+        self.graph = CkApstraGraph(self.session.get_items(f"blueprints/{self.id}"))
+        self.logger.info(f"loaded local graph: version {self.graph.version}, {len(self.graph.nodes_by_id)} nodes")
+        return self.graph
+
+    def drop_graph(self) -> None:
+        """
+        Drop the local snapshot of the blueprint graph
+        """
+        self.graph = None
+
+    def _on_write(self, keeps_inventory: bool = False) -> None:
+        """
+        Called by every write through this blueprint. The local data is not current anymore.
+
+        Args:
+            keeps_inventory: The writer updated the inventory. ex) add_generic_systems
+        """
+        if not keeps_inventory:
+            self.inventory.invalidate()
+        if self.graph:
+            self.logger.debug("dropping local graph after write")
+            self.drop_graph()
+        self.query_cache.clear()
+        self.staging_version = None
+
+    def get_staging_version(self, refresh: bool = False) -> int:
+        """
+        Get the staging version of the blueprint, asked to the controller at most every version_ttl seconds.
+
+        Returns:
+            The staging version, or None if not available
+        """
+        now = time.monotonic()
+        if refresh or self.staging_version is None or now - self.staging_version_at > self.version_ttl:
+            diff_status = self.session.get(f"{self.url_prefix}/diff-status")
+            self.staging_version = diff_status.json().get('staging_version') if diff_status.status_code == 200 else None
+            self.staging_version_at = now
+        return self.staging_version
+
+    def wait_for(self, condition, timeout: float = 60.0, initial_delay: float = 0.05, max_delay: float = 3.0, description: str = None,
+                 recheck_interval: float = None, version_gated: bool = True):
+        """
+        Wait until the condition returns a truthy value, with exponential backoff and a deadline.
+
+        The staging version is probed between the checks, and the condition is evaluated again
+        when the blueprint changed, or recheck_interval after the last check for the changes
+        settling without a new version (ex. the controller work after a commit).
+
+        Args:
+            condition: The callable without argument. The truthy return value satisfies the wait.
+            timeout: The seconds to give up.
+            initial_delay: The first delay in seconds, doubled up to max_delay.
+            max_delay: The maximum delay in seconds.
+            description: The text for the logs.
+            recheck_interval: The maximum seconds between the checks at the same version. max_delay if None.
+            version_gated: Set False to evaluate the condition at every poll without probing the version.
+
+        Returns:
+            The return value of the condition, or None at the deadline.
+        """
+        description = description or getattr(condition, '__name__', 'condition')
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        recheck_interval = max_delay if recheck_interval is None else recheck_interval
+        checked_version = None
+        checked_at = None
+        while True:
+            version = self.get_staging_version(refresh=True) if version_gated else None
+            if (version is None or version != checked_version or checked_at is None
+                    or time.monotonic() - checked_at >= recheck_interval):
+                checked_version = version
+                checked_at = time.monotonic()
+                result = condition()
+                if result:
+                    return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning(f"timeout after {timeout}s waiting for {description}")
+                return None
+            # wake up for the recheck in time
+            sleep_seconds = max(0.0, min(delay, remaining, checked_at + recheck_interval - time.monotonic()))
+            self.logger.debug("waiting %.2fs for %s at version %s", sleep_seconds, description, version)
+            time.sleep(sleep_seconds)
+            delay = min(delay * 2, max_delay)
+
+    def wait_for_query(self, query_string: str, predicate=None, multiline: bool = False, **kwargs) -> list:
+        """
+        Wait until the query result satisfies the predicate (default: not empty)
+
+        Args:
+            query_string: The query to run at each change of the blueprint.
+            predicate: The callable taking the query result.
+            kwargs: Passed to wait_for().
+
+        Returns:
+            The query result, or None at the deadline.
+        """
+        predicate = predicate or (lambda items: len(items) > 0)
+
+        def query_satisfied():
+            items = self.query(query_string, multiline=multiline, use_cache=False)
+            return items if predicate(items) else None
+        kwargs.setdefault('description', query_string.strip())
+        return self.wait_for(query_satisfied, **kwargs)
+
+    def query(self, query_string: str, print_prefix: str = None, multiline: bool = False, use_cache: bool = True,
+              check_version: bool = False) -> list:
         """
         Query the Apstra API.
 
         Args:
             query: The query string.
             strip: Strip the query string. Required in case of multi-line query.
+            use_cache: Return the cached result of the same query since the last write through this blueprint.
+                Set False to poll for the changes made by the controller.
+            check_version: Probe the staging version first, and drop the cached results if it changed.
+                For the changes made outside this client. Costs a diff-status request.
 
         Returns:
             The results of the query.
@@ -87,59 +232,56 @@ class CkApstraBlueprint:
             query_candidate = query_candidate.replace("\n", '')
         if print_prefix:
             self.logger.info(f"{print_prefix}: {query_string}")
+        if self.graph:
+            try:
+                return self.graph.query(query_candidate)
+            except CkGraphUnsupported as e:
+                self.logger.debug(f"querying the controller. not supported locally: {e}")
+        cache_key = None
+        if use_cache and not print_prefix:
+            if check_version:
+                self.query_cache.sync_version(self.get_staging_version(refresh=True))
+            # a write during the query starts a new generation, and the result is not stored
+            cache_generation = self.query_cache.generation
+            cache_key = (cache_generation, CkQueryCache.normalize(query_candidate))
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                return cached
         url = f"{self.url_prefix}/qe"
         payload = {
             "query": query_candidate
         }
-        response = self.session.session.post(url, json=payload)
+        # qe has no side effect. safe to resend on a dropped connection
+        response = self.session.post(url, json=payload, retry_safe=True)
         if print_prefix or response.status_code != 200:
-            self.logger.warning(f"status_code {response.status_code} != 200: {payload=}, response.text={response.text}")
+            self.logger.warning("status_code %s != 200: payload=%s, response.text=%s", response.status_code, CkLogPayload(payload), CkLogPayload(response.text))
         # the content should have 'items'. otherwise, the query would be invalid
         elif 'items' not in response.json():
-            self.logger.warning(f"items does not exist: {query_string=}, {response.text=}")
-        return response.json()['items']
+            self.logger.warning("items does not exist: query_string=%s, response.text=%s", CkLogPayload(query_string), CkLogPayload(response.text))
+        items = response.json()['items']
+        if cache_key is not None and response.status_code == 200:
+            self.query_cache.put(cache_key, items, cache_generation)
+        return items
     
     # return the first entry for the system
     def get_system_with_im(self, system_label):
-        system_im = self.query(f"node('system', label='{system_label}', name='system').out().node('interface_map', name='im')")[0]
-        if system_label not in self.system_label_2_id_cache:
-            self.system_label_2_id_cache[system_label] = system_im['system']['id']
-            self.system_id_2_label_cache[system_im['system']['id']] = system_label
-            if  'interface_map_id' not in self.system_label_2_id_cache[system_label]:
-                self.system_label_2_id_cache[system_label]['interface_map_id'] = system_im['im']['id']
-                self.system_label_2_id_cache[system_label]['device_profile_id'] = system_im['im']['device_profile_id']
-        return system_im
+        """
+        Return { system: <system node>, im: <interface_map node> } of the system label, or None
+        """
+        return self.inventory.get(system_label)
 
     def get_system_node_from_label(self, system_label) -> dict:
         """
-        Return the system dict from the system label
+        Return the system dict from the system label, or None if the system does not exist
         called from move_access_switch
         """
-        # cache the id of the system_label if not already cached
-        if system_label not in self.system_label_2_id_cache:
-            system_query_result = self.query(f"node('system', label='{system_label}', name='system')")
-            # skip if the system does not exist
-            if len(system_query_result) == 0:
-                return None            
-            id = system_query_result[0]['system']['id']
-            # sn = system_query_result[0]['system']['system_id']
-            # deploy_mode = system_query_result[0]['system']['deploy_mode']
-            # self.system_label_2_id_cache[system_label] = { 
-            #     'id': id,
-            #     'sn': sn,
-            #     'deploy_mode': deploy_mode
-            #     }
-            self.system_label_2_id_cache[system_label] = system_query_result[0]['system']
-            self.system_id_2_label_cache[id] = system_label
-        return self.system_label_2_id_cache[system_label]
+        return self.inventory.get_system(system_label)
 
     def get_system_label(self, system_id):
         '''
         Get the system label from the system id
         '''
-        if system_id not in self.system_id_2_label_cache:
-            return None
-        return self.system_id_2_label_cache[system_id]
+        return self.inventory.get_label(system_id)
 
     def get_server_interface_nodes(self, system_label, intf_name=None) -> str:
         """
@@ -224,6 +366,7 @@ class CkApstraBlueprint:
         # untagged_ct = [x['id'] for x in ct_list if x and 'untagged' in x['ep_endpoint_policy']['attributes']][0] or None
         return (tagged_ct, untagged_ct)
 
+    @writes_blueprint
     def add_generic_system(self, gs_spec: dict) -> list:
         """
         Add a generic system (and access switch pair) to the blueprint.
@@ -240,14 +383,120 @@ class CkApstraBlueprint:
             # skipping if the system already exists
             return []
         url = f"{self.url_prefix}/switch-system-links"
-        created_generic_system = self.session.session.post(url, json=gs_spec)
+        created_generic_system = self.session.post(url, json=gs_spec)
         if created_generic_system.status_code >= 400:
-            self.logger.error(f"System not created: {created_generic_system=}, {created_generic_system.status_code=}, {created_generic_system.text=}")
+            self.logger.error("System not created: %s, status_code=%s, text=%s", created_generic_system, created_generic_system.status_code, CkLogPayload(created_generic_system.text))
             return []
         if created_generic_system is None or len(created_generic_system.json()) == 0 or 'ids' not in created_generic_system.json():
             return []
         return created_generic_system.json()['ids']
 
+    @staticmethod
+    def merge_switch_system_links(gs_specs: list) -> dict:
+        """
+        Merge the switch-system-links specs into one body with all the new_systems and links
+
+        The links of a new system refer to it by new_system_index in the merged new_systems.
+
+        Args:
+            gs_specs: The specifications of the generic systems, like the one of add_generic_system.
+
+        Returns:
+            { new_systems: [ ... ], links: [ ... ] }
+        """
+        merged = {
+            'links': [],
+            'new_systems': [],
+        }
+        for gs_spec in gs_specs:
+            index_base = len(merged['new_systems'])
+            merged['new_systems'].extend(gs_spec['new_systems'])
+            for link_spec in gs_spec['links']:
+                system = dict(link_spec.get('system') or {})
+                if system.get('system_id') is None:
+                    # the spec of one system leaves the index to default to 0
+                    system['new_system_index'] = index_base + (system.get('new_system_index') or 0)
+                merged['links'].append({**link_spec, 'system': system})
+        return merged
+
+    @writes_blueprint(keeps_inventory=True)
+    def add_generic_systems(self, gs_specs: list, max_systems_per_request: int = 20) -> dict:
+        """
+        Add many generic systems to the blueprint in a few switch-system-links requests.
+
+        The specs are merged into one request per max_systems_per_request systems. A request is
+        all or nothing, so the systems of a failed request are retried one by one, and a bad spec
+        fails only its own system.
+
+        Args:
+            gs_specs: The specifications of the generic systems, like the one of add_generic_system.
+            max_systems_per_request: The maximum number of the systems in a switch-system-links request.
+
+        Returns:
+            { <generic system label>: [ <link id> ] } of the created systems.
+                The link ids are in the order of the links of the spec. The systems failed to create are absent.
+        """
+        # the inventory is loaded once, and kept current below with the created systems
+        new_specs = []
+        for gs_spec in gs_specs:
+            label = gs_spec['new_systems'][0]['label']
+            if self.inventory.get_system(label):
+                self.logger.info(f"skipping: {label} is present in the blueprint")
+                continue
+            new_specs.append(gs_spec)
+        if len(new_specs) == 0:
+            return {}
+
+        url = f"{self.url_prefix}/switch-system-links"
+        failed = {}  # { label: response text }
+        request_count = 0
+        for start in range(0, len(new_specs), max_systems_per_request):
+            chunk = new_specs[start:start + max_systems_per_request]
+            created = self.session.post(url, json=self.merge_switch_system_links(chunk))
+            request_count += 1
+            if created.status_code < 400:
+                continue
+            if len(chunk) == 1:
+                failed[chunk[0]['new_systems'][0]['label']] = created.text
+                continue
+            self.logger.warning("switch-system-links of %s systems failed: %s. retrying one by one", len(chunk), CkLogPayload(created.text))
+            for gs_spec in chunk:
+                created = self.session.post(url, json=gs_spec)
+                request_count += 1
+                if created.status_code >= 400:
+                    failed[gs_spec['new_systems'][0]['label']] = created.text
+        for label, text in failed.items():
+            self.logger.error("switch-system-links of %s failed: %s", label, CkLogPayload(text))
+        self.logger.info(f"added {len(new_specs) - len(failed)} of {len(new_specs)} generic systems in {request_count} switch-system-links requests")
+        new_specs = [x for x in new_specs if x['new_systems'][0]['label'] not in failed]
+        if len(new_specs) == 0:
+            return {}
+
+        # resolve the link ids of the new systems in one query
+        new_labels = [x['new_systems'][0]['label'] for x in new_specs]
+        switch_ids = sorted(set(link['switch']['system_id'] for x in new_specs for link in x['links']))
+        link_query = f"""
+            node('system', system_type='server', label=is_in({new_labels}), name='server')
+                .out('hosted_interfaces').node('interface', name='gs_intf')
+                .out('link').node('link', name='link')
+                .in_('link').node('interface', if_type='ethernet', name='sw_intf')
+                .in_('hosted_interfaces').node('system', id=is_in({switch_ids}), name='switch')
+        """
+        link_id_map = {}  # { (server label, switch id, switch if_name): link id }
+        for nodes in self.query(link_query, multiline=True, use_cache=False):
+            link_id_map[(nodes['server']['label'], nodes['switch']['id'], nodes['sw_intf']['if_name'])] = nodes['link']['id']
+            # the generic systems have no interface map
+            self.inventory.add(nodes['server'])
+
+        created = {}
+        for label, gs_spec in zip(new_labels, new_specs):
+            link_ids = [link_id_map.get((label, link['switch']['system_id'], link['switch']['if_name'])) for link in gs_spec['links']]
+            if None in link_ids:
+                self.logger.error(f"System not created: {label}, {link_ids=}")
+                continue
+            created[label] = link_ids
+        return created
+
     def get_transformation_id(self, system_label, intf_name, speed) -> int:
         '''
         Get the transformation ID for the interface
@@ -258,18 +507,9 @@ class CkApstraBlueprint:
             speed: The speed of the interface in the format of '10G'
         '''
         system_im = self.get_system_with_im(system_label)
-        device_profile = self.session.get_device_profile(system_im['im']['device_profile_id'])
-
-        for port in device_profile['ports']:
-            for transformation in port['transformations']:
-                # self.logger.debug(f"{transformation=}")
-                for intf in transformation['interfaces']:
-                    # if intf['name'] == intf_name:
-                    #     self.logger.debug(f"{intf=}")
-                    if intf['name'] == intf_name and intf['speed']['unit'] == speed[-1:] and intf['speed']['value'] == int(speed[:-1]): 
-                        # self.logger.warning(f"{intf_name=}, {intf=}")
-                        return transformation['transformation_id']
+        return self.session.catalog.get_transformation_id(system_im['im']['device_profile_id'], intf_name, speed)
 
+    @writes_blueprint
     def patch_item(self, url: str, patch_spec: dict, params=None) -> dict:
         """
         Patch an items.
@@ -281,10 +521,10 @@ class CkApstraBlueprint:
         Returns:
             The return
         """
-        url = f"{self.url_prefix}/{url}"
-        self.logger.debug(f"patch_item({url}, {patch_spec})")
-        return self.session.patch_item(url, patch_spec, params=params)
+        self.logger.debug("patch_item(%s, %s)", url, CkLogPayload(patch_spec))
+        return self.session.patch_item(f"blueprints/{self.id}/{url}", patch_spec, params=params)
 
+    @writes_blueprint
     def patch_leaf_server_link(self, link_spec: dict) -> None:
         """
         Patch a leaf-server link.
@@ -295,32 +535,36 @@ class CkApstraBlueprint:
         url = f"{self.url_prefix}/leaf-server-link-labels"
         self.session.patch_throttled(url, spec=link_spec)
 
+    @writes_blueprint
     def patch_obj_policy_batch_apply(self, policy_spec, params=None):
         '''
         Apply policies in a batch
         '''
         return self.session.patch_throttled(f"{self.url_prefix}/obj-policy-batch-apply", spec=policy_spec, params=params)
 
+    @writes_blueprint
     def patch_leaf_server_link_labels(self, spec, params=None, print_prefix=None):
         '''
         Update the generic system links
         '''
         if print_prefix:
-            self.logger.info(f"{print_prefix}: {spec=}")
+            self.logger.info("%s: spec=%s", print_prefix, CkLogPayload(spec))
         return self.session.patch_throttled(f"{self.url_prefix}/leaf-server-link-labels", spec=spec, params=params)
 
+    @writes_blueprint
     def patch_node_single(self, node, patch_spec, params=None):
         '''
         Patch node data
         '''
-        return self.session.session.patch(f"{self.url_prefix}/nodes/{node}", json=patch_spec, params=params)
+        return self.session.patch(f"{self.url_prefix}/nodes/{node}", json=patch_spec, params=params)
 
+    @writes_blueprint
     def patch_nodes(self, patch_spec, params=None):
         '''
         Patch node data with patch_spec list
         '''
         params_to_use = params or {'async': 'full'}
-        return self.session.session.patch(f"{self.url_prefix}/nodes", json=patch_spec, params=params_to_use)
+        return self.session.patch(f"{self.url_prefix}/nodes", json=patch_spec, params=params_to_use)
 
 
     def get_virtual_network(self, vni):
@@ -334,9 +578,27 @@ class CkApstraBlueprint:
         vn_id = vn_id_got[0]['vn']['id']
         return self.session.get_items(f"blueprints/{self.id}/virtual-networks/{vn_id}")
     
+    def get_virtual_networks(self) -> dict:
+        '''
+        Get all the virtual networks of the blueprint in one call
+
+        Returns:
+            { <vni in str>: <virtual network spec> }
+        '''
+        virtual_networks = self.session.get_items(f"blueprints/{self.id}/virtual-networks")['virtual_networks']
+        vn_table = {}
+        for vn_id, vn_spec in virtual_networks.items():
+            vn_spec.setdefault('id', vn_id)
+            vn_table[str(vn_spec['vn_id'])] = vn_spec
+        return vn_table
+
+    @writes_blueprint
     def patch_virtual_network(self, patch_spec, params=None, svi_requirement=False):
         '''
         Patch virtual network data
+
+        Returns:
+            The response. HTTP 429 is retried by the rate limiter of the transport.
         '''
         if params is None:
             params = {
@@ -345,15 +607,16 @@ class CkApstraBlueprint:
                 'type': 'staging',
                 'svi_requirements': 'true'
             }
-        patched = self.session.patch_throttled(f"{self.url_prefix}/virtual-networks/{patch_spec['id']}", spec=patch_spec, params=params)
-        return patched
+        return self.session.patch(f"{self.url_prefix}/virtual-networks/{patch_spec['id']}", json=patch_spec, params=params)
     
+    @writes_blueprint
     def post_item(self, item_url, item_spec, params=None):
         '''
         Create an item
         '''
-        return self.session.session.post(f"{self.url_prefix}/{item_url}", json=item_spec, params=params)
+        return self.session.post(f"{self.url_prefix}/{item_url}", json=item_spec, params=params)
 
+    @writes_blueprint
     def post_tagging(self, nodes, tags_to_add = None, tags_to_remove = None, params=None, print_prefix=None):
         '''
         Update the tagging
@@ -389,15 +652,26 @@ class CkApstraBlueprint:
         tagging_spec['add'] = tags_to_add
         tagging_spec['remove'] = tags_to_remove
         if print_prefix:
-            self.logger.info(f"{print_prefix}: {nodes=}, {tags_to_add=}, {tags_to_remove=}, {tagging_spec=}")
-        return self.session.session.post(f"{self.url_prefix}/tagging", json=tagging_spec, params={'aync': 'full'})
+            self.logger.info("%s: nodes=%s, tags_to_add=%s, tags_to_remove=%s, tagging_spec=%s", print_prefix, CkLogPayload(nodes), tags_to_add, tags_to_remove, CkLogPayload(tagging_spec))
+        return self.session.post(f"{self.url_prefix}/tagging", json=tagging_spec, params={'aync': 'full'})
 
-    def batch(self, batch_spec: dict, params=None) -> None:
+    @writes_blueprint
+    def batch(self, batch_spec: dict, params=None):
         '''
         Run API commands in batch
+
+        Returns:
+            The response of /batch
         '''
         url = f"{self.url_prefix}/batch"
-        self.session.session.post(url, json=batch_spec, params=params)
+        return self.session.post(url, json=batch_spec, params=params)
+
+    def batch_builder(self, **kwargs) -> CkBatchBuilder:
+        '''
+        Return an accumulator of the operations to run in /batch
+            kwargs: max_operations, max_payload_bytes, max_policies_per_operation, params
+        '''
+        return CkBatchBuilder(self, **kwargs)
 
     # def get_cts_on_generic_system_with_only_ae(self, generic_system_label) -> list:
     #     '''
@@ -433,10 +707,43 @@ class CkApstraBlueprint:
         ct_list = [ x['batch']['id'] for x in self.query(ct_list_spec, multiline=True) ]
         return ct_list
 
+    def get_interfaces_cts(self, interface_ids: list) -> dict:
+        '''
+        Get the CTs of many interfaces in one query
+
+        Returns:
+            { <interface id>: set(<CT id>) }. The interfaces without CT are absent.
+        '''
+        interface_ids = list(interface_ids)
+        interfaces_cts = {}
+        if len(interface_ids) == 0:
+            return interfaces_cts
+        ct_list_spec = f"""
+            match(
+                node(id=is_in({interface_ids}), name='interface')
+                    .out().node('ep_group')
+                    .in_().node('ep_application_instance')
+                    .out().node('ep_endpoint_policy', policy_type_name='batch', name='batch')
+            ).distinct(['interface', 'batch'])
+        """
+        for nodes in self.query(ct_list_spec, multiline=True, use_cache=False):
+            interfaces_cts.setdefault(nodes['interface']['id'], set()).add(nodes['batch']['id'])
+        return interfaces_cts
+
+    @writes_blueprint
     def add_single_vlan_ct(self, vni: str, is_tagged: bool ) -> str:
         '''
         Create a single VLAN CT
         '''
+        return self.add_single_vlan_cts([(vni, is_tagged)]).get((str(vni), is_tagged))
+
+    @staticmethod
+    def build_single_vlan_ct_policies(vni: str, vn_id: str, is_tagged: bool) -> tuple:
+        '''
+        Build the policies of a single VLAN CT for obj-policy-import
+
+        Return tuple of (CT id, policies)
+        '''
         tagged_type = 'tagged' if is_tagged else 'untagged'
         if is_tagged:
             ct_label = f"vn{int(vni)-100000}"
@@ -445,65 +752,101 @@ class CkApstraBlueprint:
         uuid_batch = str(uuid.uuid4())
         uuid_pipeline = str(uuid.uuid4())
         uuid_vlan = str(uuid.uuid4())
-        vn_id = self.query(f"node('virtual_network', vn_id='{vni}', name='vn')")[0]['vn']['id']
-        policy_spec = {
-            "policies": [
-                {
-                    "description": f"Single VLAN Connectivity Template for VNI {vni}",
-                    "tags": [],
-                    "user_data": f"{{\"isSausage\":true,\"positions\":{{\"{uuid_vlan}\":[290,80,1]}}}}",
-                    "label": f"vn{int(vni)-100000}",
-                    "visible": True,
-                    "policy_type_name": "batch",
-                    "attributes": {
-                        "subpolicies": [ uuid_pipeline ]
-                    },
-                    "id": uuid_batch
+        policies = [
+            {
+                "description": f"Single VLAN Connectivity Template for VNI {vni}",
+                "tags": [],
+                "user_data": f"{{\"isSausage\":true,\"positions\":{{\"{uuid_vlan}\":[290,80,1]}}}}",
+                "label": ct_label,
+                "visible": True,
+                "policy_type_name": "batch",
+                "attributes": {
+                    "subpolicies": [ uuid_pipeline ]
                 },
-                {
-                    "description": "Add a single VLAN to interfaces, as tagged or untagged.",
-                    "label": "Virtual Network (Single)",
-                    "visible": False,
-                    "attributes": {
-                        "vn_node_id": vn_id,
-                        "tag_type": tagged_type
-                    },
-                    "policy_type_name": "AttachSingleVLAN",
-                    "id": uuid_vlan
+                "id": uuid_batch
+            },
+            {
+                "description": "Add a single VLAN to interfaces, as tagged or untagged.",
+                "label": "Virtual Network (Single)",
+                "visible": False,
+                "attributes": {
+                    "vn_node_id": vn_id,
+                    "tag_type": tagged_type
                 },
-                {
-                    "description": "Add a single VLAN to interfaces, as tagged or untagged.",
-                    "label": "Virtual Network (Single) (pipeline)",
-                    "visible": False,
-                    "attributes": {
-                        "second_subpolicy": None,
-                        "first_subpolicy": uuid_vlan
-                    },
-                    "policy_type_name": "pipeline",
-                    "id": uuid_pipeline
-                }
-            ]
+                "policy_type_name": "AttachSingleVLAN",
+                "id": uuid_vlan
+            },
+            {
+                "description": "Add a single VLAN to interfaces, as tagged or untagged.",
+                "label": "Virtual Network (Single) (pipeline)",
+                "visible": False,
+                "attributes": {
+                    "second_subpolicy": None,
+                    "first_subpolicy": uuid_vlan
+                },
+                "policy_type_name": "pipeline",
+                "id": uuid_pipeline
+            }
+        ]
+        return (uuid_batch, policies)
+
+    @writes_blueprint
+    def add_single_vlan_cts(self, vni_tagged_pairs: list) -> dict:
+        '''
+        Create single VLAN CTs in one obj-policy-import request
+
+        Args:
+            vni_tagged_pairs: The list of (vni, is_tagged)
+
+        Returns:
+            { (vni in str, is_tagged): CT id } of the created CTs
+        '''
+        vni_tagged_pairs = sorted(set((str(vni), is_tagged) for vni, is_tagged in vni_tagged_pairs))
+        if len(vni_tagged_pairs) == 0:
+            return {}
+        vni_list = sorted(set(vni for vni, _ in vni_tagged_pairs))
+        vn_nodes = self.query(f"node('virtual_network', vn_id=is_in({vni_list}), name='vn')")
+        vni_2_vn_id = { str(x['vn']['vn_id']): x['vn']['id'] for x in vn_nodes }
+
+        ct_id_map = {}
+        policy_spec = {
+            "policies": []
         }
+        for vni, is_tagged in vni_tagged_pairs:
+            if vni not in vni_2_vn_id:
+                self.logger.warning(f"{vni=} not found. skipping CT creation")
+                continue
+            ct_id, policies = self.build_single_vlan_ct_policies(vni, vni_2_vn_id[vni], is_tagged)
+            ct_id_map[(vni, is_tagged)] = ct_id
+            policy_spec['policies'].extend(policies)
+        if len(ct_id_map) == 0:
+            return {}
+
         url = f"{self.url_prefix}/obj-policy-import"
-        result = self.session.session.put(url, json=policy_spec)
+        result = self.session.put(url, json=policy_spec)
         # it will be 204 with b''
-        return uuid_batch
+        if result.status_code >= 400:
+            self.logger.error("CTs not created: status_code=%s, text=%s", result.status_code, CkLogPayload(result.text))
+            return {}
+        self.logger.info(f"created {len(ct_id_map)} single VLAN CTs")
+        return ct_id_map
 
     def get_cabling_maps(self):
         '''
         Get the cabling maps
         '''
         url = f"{self.url_prefix}/cabling-maps"
-        return self.session.session.get(url).json()
+        return self.session.get(url).json()
 
 
+    @writes_blueprint
     def revert(self):
         '''
         Revert the blueprint
         '''
         url = f"{self.url_prefix}/revert"
-        revert_result = self.session.session.post(url, json="", params={"aync": "full"})
-        self.logger.info(f"Revert result: {revert_result.json()}")
+        revert_result = self.session.post(url, json="", params={"aync": "full"})
+        self.logger.info("Revert result: %s", CkLogPayload(revert_result.text))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+import time
+
+
+# design catalog of Apstra Controller
+class CkApstraDesignCatalog:
+    """
+    Device profiles and logical devices, loaded once in bulk and indexed by id.
+
+    Each kind is pulled in one call at the first access (or by preload), and can be
+    persisted to a json file. The file is reused while it is younger than ttl_seconds
+    and was written from the same controller version.
+    """
+    # kind: the url under /api
+    KINDS = {
+        'device_profiles': 'device-profiles',
+        'logical_devices': 'design/logical-devices',
+    }
+
+    def __init__(self, session, cache_file: str = None, ttl_seconds: float = None) -> None:
+        """
+        Initialize a CkApstraDesignCatalog object.
+
+        Args:
+            session: The CkApstraSession to pull the catalog with.
+            cache_file: The json file to persist the catalog. Not persisted if None.
+            ttl_seconds: The age to reuse the cache_file. No expiry if None.
+        """
+        self.session = session
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.logger = logging.getLogger('CkApstraDesignCatalog')
+        self.controller_version = None
+        self.index = {}  # { kind: { id: data } }
+        self.transformation_index = {}  # { device_profile_id: { (if_name, speed_unit, speed_value): transformation_id } }
+        self._lock = threading.Lock()
+        self._file_loaded = False
+
+    def get_controller_version(self) -> str:
+        """
+        Get the version of the controller, to validate the persisted catalog
+        """
+        if self.controller_version is None:
+            self.controller_version = self.session.get_items('version').get('version')
+        return self.controller_version
+
+    def _load_file(self) -> None:
+        self._file_loaded = True
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as file:
+                cached = json.load(file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"ignoring {self.cache_file}: {e=}")
+            return
+        age = time.time() - cached.get('saved_at', 0)
+        if self.ttl_seconds is not None and age > self.ttl_seconds:
+            self.logger.info(f"{self.cache_file} expired: {age=:.0f} > {self.ttl_seconds=}")
+            return
+        if cached.get('controller_version') != self.get_controller_version():
+            self.logger.info(f"{self.cache_file} is from {cached.get('controller_version')}, not {self.controller_version}")
+            return
+        self.index = {kind: cached['index'][kind] for kind in self.KINDS if kind in cached.get('index', {})}
+        self.logger.debug(f"loaded {self.cache_file}: { {k: len(v) for k, v in self.index.items()} }")
+
+    def save(self) -> None:
+        """
+        Write the catalog to the cache_file
+        """
+        if not self.cache_file:
+            return
+        cached = {
+            'saved_at': time.time(),
+            'controller_version': self.get_controller_version(),
+            'index': self.index,
+        }
+        with open(self.cache_file, 'w') as file:
+            json.dump(cached, file)
+
+    def _get_kind(self, kind: str) -> dict:
+        with self._lock:
+            if not self._file_loaded:
+                self._load_file()
+            if kind not in self.index:
+                items = self.session.get_items(self.KINDS[kind])['items']
+                self.index[kind] = {x['id']: x for x in items}
+                self.logger.debug(f"loaded {len(items)} {kind}")
+                self.save()
+            return self.index[kind]
+
+    def preload(self) -> None:
+        """
+        Load all the kinds in bulk
+        """
+        for kind in self.KINDS:
+            self._get_kind(kind)
+
+    def get_device_profile(self, device_profile_id: str) -> dict:
+        """
+        Get the device profile with the specified id, or None
+        """
+        return self._get_kind('device_profiles').get(device_profile_id)
+
+    def get_logical_device(self, logical_device_id: str) -> dict:
+        """
+        Get the logical device with the specified id, or None
+        """
+        return self._get_kind('logical_devices').get(logical_device_id)
+
+    def get_transformation_index(self, device_profile_id: str) -> dict:
+        """
+        Get the transformation index of the device profile, built at the first call
+
+        Returns:
+            { (if_name, speed_unit, speed_value): transformation_id }
+        """
+        if device_profile_id not in self.transformation_index:
+            transformation_index = {}
+            device_profile = self.get_device_profile(device_profile_id) or {'ports': []}
+            for port in device_profile['ports']:
+                for transformation in port['transformations']:
+                    for intf in transformation['interfaces']:
+                        # the first transformation wins like the linear scan
+                        transformation_index.setdefault(
+                            (intf['name'], intf['speed']['unit'], intf['speed']['value']),
+                            transformation['transformation_id'])
+            self.transformation_index[device_profile_id] = transformation_index
+        return self.transformation_index[device_profile_id]
+
+    def get_transformation_id(self, device_profile_id: str, if_name: str, speed: str) -> int:
+        """
+        Get the transformation id of the interface
+
+        Args:
+            device_profile_id: The id of the device profile
+            if_name: The name of the interface
+            speed: The speed of the interface in the format of '10G'
+
+        Returns:
+            The transformation id, or None
+        """
+        return self.get_transformation_index(device_profile_id).get((if_name, speed[-1:], int(speed[:-1])))
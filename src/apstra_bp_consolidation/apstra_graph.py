@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import ast
+import copy
+import logging
+
+
+class CkGraphUnsupported(Exception):
+    """
+    The query uses the graph query language beyond the local subset
+    """
+
+
+class CkGraphPredicate:
+    """
+    The attribute predicate like is_in([...]) and ne(...)
+    """
+
+    def __init__(self, label: str, test, values: list = None) -> None:
+        self.label = label
+        self.test = test
+        self.values = values  # the values of is_in() as strings, in the order given
+
+    def __repr__(self) -> str:
+        return self.label
+
+
+def is_in(values) -> CkGraphPredicate:
+    values = list(values)
+    # the strings are built once, not at every test
+    strings = list(dict.fromkeys(str(v) for v in values if v is not None))
+    string_set = frozenset(strings)
+    has_none = None in values
+
+    def test(x) -> bool:
+        return has_none if x is None else str(x) in string_set
+    return CkGraphPredicate(f"is_in({values})", test, strings)
+
+
+def ne(value) -> CkGraphPredicate:
+    return CkGraphPredicate(f"ne({value!r})", lambda x: not _is_equal(x, value))
+
+
+def _is_equal(actual, expected) -> bool:
+    # the query carries the numbers as strings. ex) vn_id='100001'
+    return actual == expected or (actual is not None and str(actual) == str(expected))
+
+
+class CkGraphNodeStep:
+    """
+    node(type, name=name, **attributes) in a path
+    """
+
+    def __init__(self, type: str = None, name: str = None, **attributes) -> None:
+        self.type = type
+        self.name = name
+        self.attributes = attributes
+
+    def is_match(self, node: dict) -> bool:
+        if self.type is not None and node.get('type') != self.type:
+            return False
+        for key, expected in self.attributes.items():
+            actual = node.get(key)
+            if isinstance(expected, CkGraphPredicate):
+                if not expected.test(actual):
+                    return False
+            elif not _is_equal(actual, expected):
+                return False
+        return True
+
+
+class CkGraphPath:
+    """
+    node().out().node().in_().node() ...
+        nodes[i] and nodes[i+1] are connected by edges[i] of (direction, relationship type)
+    """
+
+    def __init__(self) -> None:
+        self.nodes = []
+        self.edges = []
+        self.distinct_names = None
+
+    def node(self, type: str = None, name: str = None, **attributes):
+        if len(self.nodes) > len(self.edges):
+            raise CkGraphUnsupported("node() should follow out() or in_()")
+        self.nodes.append(CkGraphNodeStep(type, name, **attributes))
+        return self
+
+    def out(self, type: str = None):
+        self.edges.append(('out', type))
+        return self
+
+    def in_(self, type: str = None):
+        self.edges.append(('in', type))
+        return self
+
+    def distinct(self, names: list):
+        self.distinct_names = list(names)
+        return self
+
+    def names(self) -> list:
+        return [x.name for x in self.nodes if x.name]
+
+    def __getattr__(self, attr):
+        # where(), ensure_different(), having() ...
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        raise CkGraphUnsupported(f"{attr}() is not supported locally")
+
+
+class CkGraphOptional:
+    """
+    optional(path) in a match
+    """
+
+    def __init__(self, *paths) -> None:
+        self.paths = paths
+
+    def names(self) -> list:
+        return [name for path in self.paths for name in path.names()]
+
+
+class CkGraphMatch:
+    """
+    match(path, path, optional(path), ...)
+    """
+
+    def __init__(self, *clauses) -> None:
+        self.clauses = clauses
+        self.distinct_names = None
+
+    def distinct(self, names: list):
+        self.distinct_names = list(names)
+        return self
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        raise CkGraphUnsupported(f"{attr}() is not supported locally")
+
+
+# local snapshot of a blueprint graph
+class CkApstraGraph:
+    """
+    The nodes and the relationships of a blueprint, indexed by id, type and label with the adjacency lists.
+
+    It evaluates the subset of the graph query language used in this project:
+        node, out, in_, match, optional, is_in, ne, distinct
+    The other constructs raise CkGraphUnsupported, to fall back to the qe of the controller.
+    """
+
+    def __init__(self, blueprint_data: dict) -> None:
+        """
+        Build the indexes from the blueprint data of /api/blueprints/<id>
+
+        Args:
+            blueprint_data: The blueprint with 'nodes' and 'relationships' (dict by id, or list)
+        """
+        self.logger = logging.getLogger('CkApstraGraph')
+        self.version = blueprint_data.get('version')
+        self.nodes_by_id = {}
+        self.nodes_by_type = {}  # { type: [ node ] }
+        self.nodes_by_label = {}  # { label: [ node ] }
+        self.out_edges = {}  # { node_id: [ (relationship type, target node id) ] }
+        self.in_edges = {}  # { node_id: [ (relationship type, source node id) ] }
+
+        nodes = blueprint_data.get('nodes') or {}
+        for node in (nodes.values() if isinstance(nodes, dict) else nodes):
+            self.nodes_by_id[node['id']] = node
+            self.nodes_by_type.setdefault(node.get('type'), []).append(node)
+            if node.get('label') is not None:
+                self.nodes_by_label.setdefault(node['label'], []).append(node)
+
+        relationships = blueprint_data.get('relationships') or {}
+        for rel in (relationships.values() if isinstance(relationships, dict) else relationships):
+            self.out_edges.setdefault(rel['source_id'], []).append((rel.get('type'), rel['target_id']))
+            self.in_edges.setdefault(rel['target_id'], []).append((rel.get('type'), rel['source_id']))
+
+        self.logger.debug(f"{self.version=} {len(self.nodes_by_id)=} {len(relationships)=}")
+
+    FUNCTIONS = {
+        'node': lambda *args, **kwargs: CkGraphPath().node(*args, **kwargs),
+        'match': CkGraphMatch,
+        'optional': CkGraphOptional,
+        'is_in': is_in,
+        'ne': ne,
+    }
+    METHODS = frozenset(['node', 'out', 'in_', 'distinct'])
+
+    def parse(self, query_string: str):
+        """
+        Parse the query string into CkGraphPath or CkGraphMatch
+
+        The query is not run by eval(). Only the calls of FUNCTIONS and METHODS with
+        constant and list arguments are evaluated from the syntax tree.
+        """
+        try:
+            tree = ast.parse(f"({query_string.strip()})", mode='eval')
+            parsed = self._evaluate(tree.body)
+        except CkGraphUnsupported:
+            raise
+        except Exception as e:
+            raise CkGraphUnsupported(f"{e!r}")
+        if not isinstance(parsed, (CkGraphPath, CkGraphMatch)):
+            raise CkGraphUnsupported(f"{type(parsed)} is not a query")
+        return parsed
+
+    def _evaluate(self, tree: ast.AST):
+        if isinstance(tree, ast.Constant):
+            return tree.value
+        if isinstance(tree, (ast.List, ast.Tuple)):
+            return [self._evaluate(x) for x in tree.elts]
+        if not isinstance(tree, ast.Call):
+            raise CkGraphUnsupported(f"{type(tree).__name__} is not supported locally")
+        if any(isinstance(x, ast.Starred) for x in tree.args) or any(x.arg is None for x in tree.keywords):
+            raise CkGraphUnsupported("* and ** arguments are not supported locally")
+        if isinstance(tree.func, ast.Name):
+            if tree.func.id not in self.FUNCTIONS:
+                raise CkGraphUnsupported(f"{tree.func.id}() is not supported locally")
+            function = self.FUNCTIONS[tree.func.id]
+        elif isinstance(tree.func, ast.Attribute):
+            target = self._evaluate(tree.func.value)
+            if not isinstance(target, (CkGraphPath, CkGraphMatch)) or tree.func.attr not in self.METHODS:
+                raise CkGraphUnsupported(f"{tree.func.attr}() is not supported locally")
+            function = getattr(target, tree.func.attr)
+        else:
+            raise CkGraphUnsupported(f"{type(tree.func).__name__} call is not supported locally")
+        args = [self._evaluate(x) for x in tree.args]
+        kwargs = {x.arg: self._evaluate(x.value) for x in tree.keywords}
+        return function(*args, **kwargs)
+
+    def query(self, query_string: str) -> list:
+        """
+        Evaluate the query locally
+
+        Returns:
+            The list of { name: node } like the items of qe. The unmatched optional nodes are None.
+                The nodes are copies, so the caller can edit them without touching the snapshot.
+        """
+        parsed = self.parse(query_string)
+        if isinstance(parsed, CkGraphPath):
+            rows = list(self._match_path(parsed, {}))
+        else:
+            rows = self._match(parsed)
+        if parsed.distinct_names:
+            rows = self._distinct(rows, parsed.distinct_names)
+        # the rows hold the nodes of the snapshot. copied like the query cache does
+        return copy.deepcopy(rows)
+
+    def _match(self, match: CkGraphMatch) -> list:
+        rows = [{}]
+        for clause in match.clauses:
+            if isinstance(clause, CkGraphPath):
+                rows = [x for row in rows for x in self._match_path(clause, row)]
+            elif isinstance(clause, CkGraphOptional):
+                optional_rows = []
+                for row in rows:
+                    extended = [row]
+                    for path in clause.paths:
+                        extended = [x for y in extended for x in self._match_path(path, y)]
+                    if extended:
+                        optional_rows.extend(extended)
+                    else:
+                        optional_rows.append({**{x: None for x in clause.names() if x not in row}, **row})
+                rows = optional_rows
+            else:
+                raise CkGraphUnsupported(f"{clause=} in match()")
+        return rows
+
+    @staticmethod
+    def _distinct(rows: list, names: list) -> list:
+        seen = set()
+        distinct_rows = []
+        for row in rows:
+            key = tuple(row[x]['id'] if row.get(x) else None for x in names)
+            if key not in seen:
+                seen.add(key)
+                distinct_rows.append(row)
+        return distinct_rows
+
+    def _candidates(self, step: CkGraphNodeStep, row: dict) -> list:
+        bound = step.name and row.get(step.name)
+        if bound:
+            return [bound]
+        node_id = step.attributes.get('id')
+        if isinstance(node_id, str):
+            node = self.nodes_by_id.get(node_id)
+            return [node] if node else []
+        if isinstance(node_id, CkGraphPredicate) and node_id.values is not None:
+            return [self.nodes_by_id[x] for x in node_id.values if x in self.nodes_by_id]
+        label = step.attributes.get('label')
+        if isinstance(label, str):
+            return self.nodes_by_label.get(label, [])
+        if step.type is not None:
+            return self.nodes_by_type.get(step.type, [])
+        return list(self.nodes_by_id.values())
+
+    @staticmethod
+    def _bind(step: CkGraphNodeStep, node: dict, binding: dict):
+        """
+        Return the binding with the node, or None if it conflicts
+        """
+        if not step.is_match(node):
+            return None
+        if not step.name:
+            return binding
+        bound = binding.get(step.name)
+        if bound:
+            return binding if bound['id'] == node['id'] else None
+        return {**binding, step.name: node}
+
+    def _neighbors(self, node_id: str, direction: str, rel_type: str) -> list:
+        edges = self.out_edges if direction == 'out' else self.in_edges
+        return [self.nodes_by_id[peer_id] for edge_type, peer_id in edges.get(node_id, [])
+                if (rel_type is None or edge_type == rel_type) and peer_id in self.nodes_by_id]
+
+    def _walk(self, path: CkGraphPath, index: int, step: int, node: dict, binding: dict):
+        next_index = index + step
+        if next_index < 0 or next_index >= len(path.nodes):
+            yield binding
+            return
+        if step > 0:
+            direction, rel_type = path.edges[index]
+        else:
+            # walking backward reverses the direction
+            direction, rel_type = path.edges[next_index]
+            direction = 'in' if direction == 'out' else 'out'
+        for peer in self._neighbors(node['id'], direction, rel_type):
+            next_binding = self._bind(path.nodes[next_index], peer, binding)
+            if next_binding is not None:
+                yield from self._walk(path, next_index, step, peer, next_binding)
+
+    def _match_path(self, path: CkGraphPath, row: dict):
+        if len(path.edges) != len(path.nodes) - 1:
+            raise CkGraphUnsupported("the path should end with node()")
+        # start from the node already bound by the previous paths, to avoid scanning
+        anchor = next((i for i, x in enumerate(path.nodes) if x.name and row.get(x.name)), 0)
+        for start in self._candidates(path.nodes[anchor], row):
+            binding = self._bind(path.nodes[anchor], start, row)
+            if binding is None:
+                continue
+            for forward_binding in self._walk(path, anchor, 1, start, binding):
+                yield from self._walk(path, anchor, -1, start, forward_binding)
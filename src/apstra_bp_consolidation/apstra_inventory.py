@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import logging
+import threading
+
+
+# system inventory of a blueprint
+class CkSystemInventory:
+    """
+    All the system nodes of a blueprint (switches and generic systems) with the interface map,
+    fetched in one query and indexed by label and by id.
+
+    It is loaded at the first lookup. The blueprint invalidates it on every write through it.
+    Call refresh() to see the changes made out of this client.
+    """
+    SYSTEM = 'system'
+    INTERFACE_MAP = 'im'
+
+    def __init__(self, blueprint) -> None:
+        """
+        Initialize a CkSystemInventory object.
+
+        Args:
+            blueprint: The CkApstraBlueprint to query.
+        """
+        self.blueprint = blueprint
+        self.logger = logging.getLogger(f"CkSystemInventory({blueprint.label})")
+        self.by_label = {}  # { label: { system: <system node>, im: <interface_map node or None> } }
+        self.by_id = {}  # { id: { system: <system node>, im: <interface_map node or None> } }
+        self.is_stale = True
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one refresh at a time for the concurrent lookups
+
+    def refresh(self) -> None:
+        """
+        Fetch all the systems in one query
+        """
+        system_query = f"""
+            match(
+                node('system', name='{self.SYSTEM}'),
+                optional(
+                    node(name='{self.SYSTEM}').out('interface_map').node('interface_map', name='{self.INTERFACE_MAP}')
+                )
+            )
+        """
+        system_nodes = self.blueprint.query(system_query, multiline=True, use_cache=False)
+        by_label = {}
+        by_id = {}
+        for nodes in system_nodes:
+            entry = {
+                self.SYSTEM: nodes[self.SYSTEM],
+                self.INTERFACE_MAP: nodes[self.INTERFACE_MAP],
+            }
+            by_id[nodes[self.SYSTEM]['id']] = entry
+            if nodes[self.SYSTEM]['label'] is not None:
+                by_label[nodes[self.SYSTEM]['label']] = entry
+        with self._lock:
+            self.by_label = by_label
+            self.by_id = by_id
+            self.is_stale = False
+        self.logger.debug(f"{len(by_id)} systems")
+
+    def invalidate(self) -> None:
+        """
+        Refresh at the next lookup
+        """
+        self.is_stale = True
+
+    def add(self, system_node: dict, interface_map_node: dict = None) -> None:
+        """
+        Add or replace a system without a refresh, like the one just created
+
+        Args:
+            system_node: The system node with id and label.
+            interface_map_node: The interface_map node of the system, if any.
+        """
+        entry = {
+            self.SYSTEM: system_node,
+            self.INTERFACE_MAP: interface_map_node,
+        }
+        with self._lock:
+            self.by_id[system_node['id']] = entry
+            if system_node['label'] is not None:
+                self.by_label[system_node['label']] = entry
+
+    def _ensure_loaded(self) -> None:
+        if not self.is_stale:
+            return
+        # the lookups waiting here use the result of the first one
+        with self._refresh_lock:
+            if self.is_stale:
+                self.refresh()
+
+    def get(self, label: str) -> dict:
+        """
+        Return { system: <system node>, im: <interface_map node> } of the label, or None
+        """
+        self._ensure_loaded()
+        return self.by_label.get(label)
+
+    def get_by_id(self, id: str) -> dict:
+        """
+        Return { system: <system node>, im: <interface_map node> } of the id, or None
+        """
+        self._ensure_loaded()
+        return self.by_id.get(id)
+
+    def get_system(self, label: str) -> dict:
+        """
+        Return the system node of the label, or None
+        """
+        entry = self.get(label)
+        return entry and entry[self.SYSTEM]
+
+    def get_label(self, id: str) -> str:
+        """
+        Return the label of the system id, or None
+        """
+        entry = self.get_by_id(id)
+        return entry and entry[self.SYSTEM]['label']
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+
+class CustomFormatter(logging.Formatter):
+    grey = "\x1b[38;20m"
+    yellow = "\x1b[33;20m"
+    red = "\x1b[31;20m"
+    bold_red = "\x1b[31;1m"
+    reset = "\x1b[0m"
+    format = "%(asctime)s %(levelname)8s %(name)s:%(funcName)s() - %(message)s (%(filename)s:%(lineno)d)"
+    FORMATS = {
+        logging.DEBUG: grey + format + reset,
+        logging.INFO: grey + format + reset,
+        logging.WARNING: yellow + format + reset,
+        logging.ERROR: red + format + reset,
+        logging.CRITICAL: bold_red + format + reset
+    }
+
+    def __init__(self) -> None:
+        super().__init__()
+        # one formatter per level, built once
+        self.formatters = {level: logging.Formatter(log_fmt) for level, log_fmt in self.FORMATS.items()}
+        self.default_formatter = self.formatters[logging.DEBUG]
+
+    def format(self, record):
+        return self.formatters.get(record.levelno, self.default_formatter).format(record)
+
+
+class CkLogPayload:
+    """
+    A payload (spec, response text, ...) rendered only when the record is emitted,
+    and truncated to max_chars
+
+    Example:
+        logger.debug("patch_item(%s, %s)", url, CkLogPayload(patch_spec))
+    """
+    max_chars = 2000  # the default cap. set by prep_logging
+
+    def __init__(self, data, max_chars: int = None) -> None:
+        self.data = data
+        self.max_chars = max_chars or CkLogPayload.max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.data, (bytes, bytearray)):
+            text = self.data.decode(errors='replace')
+        elif isinstance(self.data, str):
+            text = self.data
+        else:
+            try:
+                text = json.dumps(self.data, default=str)
+            except (TypeError, ValueError, RuntimeError):
+                text = repr(self.data)
+        if len(text) <= self.max_chars:
+            return text
+        return f"{text[:self.max_chars]}...({len(text)} chars)"
+
+    __repr__ = __str__
+
+
+class CkQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue the records as they are, with the message arguments not merged
+
+    The stock QueueHandler formats the record in the logging thread. This one leaves the
+    formatting, including the rendering of CkLogPayload, to the handlers of the QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def prep_logging(log_level: str = 'INFO', use_queue: bool = False, payload_max_chars: int = None):
+    '''
+    Configure logging options
+
+    Args:
+        log_level: The level of the console handler.
+        use_queue: Format and write the records in a background thread through a queue.
+        payload_max_chars: The cap of CkLogPayload.
+    '''
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    if payload_max_chars:
+        CkLogPayload.max_chars = payload_max_chars
+
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.getLevelName(log_level))
+    ch.setFormatter(CustomFormatter())
+    if not use_queue:
+        root.addHandler(ch)
+        return
+
+    # the callers only enqueue the records. the listener thread formats and writes them
+    log_queue = queue.SimpleQueue()
+    queue_handler = CkQueueHandler(log_queue)
+    queue_handler.setLevel(ch.level)
+    root.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, ch, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
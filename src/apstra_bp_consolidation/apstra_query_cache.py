@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import re
+import threading
+from collections import OrderedDict
+
+
+# result cache of the graph queries
+class CkQueryCache:
+    """
+    LRU cache of the qe results keyed on (generation, normalized query).
+
+    The blueprint clears it on every write through the client. Each clear() starts a new
+    generation, and a result of a query sent before the write is not stored.
+    The changes made outside the client are caught only by sync_version(), on request.
+    The results are copied in and out, so the callers can modify their rows.
+
+    Example:
+        generation = cache.generation
+        items = <query the controller>
+        cache.put(key, items, generation)
+    """
+    # the quoted strings are kept as they are
+    QUOTED_PATTERN = re.compile(r"""('[^']*'|"[^"]*")""")
+    SPACE_PATTERN = re.compile(r"\s*([.,()=\[\]])\s*|\s+")
+
+    def __init__(self, maxsize: int = 512) -> None:
+        """
+        Initialize a CkQueryCache object.
+
+        Args:
+            maxsize: The maximum number of the cached results.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # incremented by every clear()
+        self.version = None  # the staging version of the last sync_version()
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def normalize(cls, query_string: str) -> str:
+        """
+        Return the query without the insignificant white spaces
+        """
+        parts = cls.QUOTED_PATTERN.split(query_string.strip())
+        # the odd parts are the quoted strings
+        return ''.join(
+            x if i % 2 else cls.SPACE_PATTERN.sub(lambda m: m.group(1) or ' ', x)
+            for i, x in enumerate(parts))
+
+    @classmethod
+    def copy_rows(cls, value):
+        """
+        Return a deep copy of the qe result
+
+        The result is plain json (dict, list and scalars), so the copy skips the memo
+        and the dispatch of copy.deepcopy.
+        """
+        if isinstance(value, dict):
+            return {k: cls.copy_rows(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [cls.copy_rows(x) for x in value]
+        return value
+
+    def get(self, key):
+        """
+        Return the cached result or None
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self.copy_rows(self._items[key])
+            self.misses += 1
+            return None
+
+    def put(self, key, result, generation: int = None) -> None:
+        """
+        Store the result, unless the cache was cleared after the generation
+
+        Args:
+            key: The cache key.
+            result: The result to store a copy of.
+            generation: The generation read before sending the query. The current one if None.
+        """
+        result = self.copy_rows(result)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._items[key] = result
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.generation += 1
+
+    def sync_version(self, version) -> None:
+        """
+        Clear the cache if the staging version differs from the last synced one
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+        self.clear()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+        }
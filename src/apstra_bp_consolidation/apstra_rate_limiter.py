@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import email.utils
+import logging
+import random
+import threading
+import time
+
+
+# client side rate governor for the Apstra Controller
+class CkRateLimiter:
+    """
+    Token bucket shared by all the verbs, which adapts the rate to the HTTP 429 responses.
+
+    Every request takes a token before it is sent. The rate is cut by decrease_factor
+    on each 429 (down to min_rate) and grows by increase_step on each success (up to max_rate).
+    The rate where the last 429 happened is kept as the learned ceiling, which is
+    approached slowly afterward.
+    """
+
+    def __init__(self, rate: float = 20.0, burst: int = 10, min_rate: float = 0.5, max_rate: float = 50.0,
+                 increase_step: float = 0.2, decrease_factor: float = 0.5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, max_attempts: int = 8) -> None:
+        """
+        Initialize a CkRateLimiter object.
+
+        Args:
+            rate: The initial requests per second.
+            burst: The bucket size.
+            min_rate: The lowest rate to cut down to.
+            max_rate: The highest rate to grow up to.
+            increase_step: The rate to add per successful request.
+            decrease_factor: The factor to multiply the rate on HTTP 429.
+            backoff_base: The first backoff in seconds when Retry-After is absent.
+            backoff_max: The maximum backoff in seconds.
+            max_attempts: The attempts per request before giving up on HTTP 429.
+        """
+        self.logger = logging.getLogger('CkRateLimiter')
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+
+        self.learned_rate = None  # the rate where the last 429 happened
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+        # counters
+        self.request_count = 0
+        self.throttled_count = 0
+        self.throttled_seconds = 0.0  # slept due to HTTP 429
+        self.waited_seconds = 0.0  # slept for the token bucket
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> float:
+        """
+        Take a token, and sleep until it is available.
+
+        Returns:
+            The seconds waited.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.request_count += 1
+            # reserve the token even if it is not there yet. the debt is paid by the sleep
+            self._tokens -= 1
+            wait_seconds = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited_seconds += wait_seconds
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def on_success(self) -> None:
+        """
+        Grow the rate after a request which was not throttled.
+        """
+        with self._lock:
+            step = self.increase_step
+            if self.learned_rate and self.rate >= self.learned_rate:
+                # slow down near the rate which was throttled before
+                step = step / 10
+            self.rate = min(self.max_rate, self.rate + step)
+
+    def on_throttled(self, retry_after: str = None, attempt: int = 0) -> float:
+        """
+        Cut the rate after HTTP 429, and return the seconds to wait before the retry.
+
+        Args:
+            retry_after: The Retry-After header value, in seconds or HTTP date.
+            attempt: The retry count of this request, starting from 0.
+
+        Returns:
+            The seconds to wait. Retry-After when given, otherwise jittered exponential backoff.
+        """
+        delay = self.parse_retry_after(retry_after)
+        if delay is None:
+            # full jitter
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        else:
+            delay = min(self.backoff_max, delay) + random.uniform(0, self.backoff_base)
+        with self._lock:
+            self.learned_rate = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # drain the bucket so the other threads wait too
+            self._tokens = min(self._tokens, 0)
+            self.throttled_count += 1
+            self.throttled_seconds += delay
+        self.logger.info(f"throttled: retry {attempt + 1}/{self.max_attempts} in {delay:.2f}s, rate {self.rate:.2f}/s")
+        return delay
+
+    @staticmethod
+    def parse_retry_after(retry_after: str = None):
+        """
+        Return the seconds from Retry-After header value or None.
+        """
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+    def stats(self) -> dict:
+        """
+        Return the counters.
+        """
+        return {
+            'request_count': self.request_count,
+            'throttled_count': self.throttled_count,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'waited_seconds': round(self.waited_seconds, 3),
+            'rate': round(self.rate, 3),
+            'learned_rate': self.learned_rate and round(self.learned_rate, 3),
+        }
@@ -1,46 +1,17 @@
 #!/usr/bin/env python3
 import requests
-import urllib3
 import logging
-import time
-from datetime import datetime
-
-class CustomFormatter(logging.Formatter):
-    grey = "\x1b[38;20m"
-    yellow = "\x1b[33;20m"
-    red = "\x1b[31;20m"
-    bold_red = "\x1b[31;1m"
-    reset = "\x1b[0m"
-    format = "%(asctime)s %(levelname)8s %(name)s:%(funcName)s() - %(message)s (%(filename)s:%(lineno)d)"
-    FORMATS = {
-        logging.DEBUG: grey + format + reset,
-        logging.INFO: grey + format + reset,
-        logging.WARNING: yellow + format + reset,
-        logging.ERROR: red + format + reset,
-        logging.CRITICAL: bold_red + format + reset
-    }
-
-    def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
-
-def prep_logging(log_level: str = 'INFO'):
-    '''Configure logging options'''
-    timestamp = datetime.now().strftime("%Y%m%d-%H:%H:%S")
-    root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
-
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.getLevelName(log_level))
-    ch.setFormatter(CustomFormatter())
-    root.addHandler(ch)
+
+from apstra_bp_consolidation.apstra_transport import CkApstraTransport
+from apstra_bp_consolidation.apstra_catalog import CkApstraDesignCatalog
+from apstra_bp_consolidation.apstra_logging import CustomFormatter, prep_logging  # noqa: F401 - the former home
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
 
 
 # https client session to Apstra Controller
 class CkApstraSession:
 
-    def __init__(self, host: str, port: int, username: str, password: str) -> None:
+    def __init__(self, host: str, port: int, username: str, password: str, transport: CkApstraTransport = None) -> None:
         self.host = host
         self.port = port
         self.username = username
@@ -49,15 +20,18 @@ class CkApstraSession:
         self.ssl_verify = False
         self.logger = logging.getLogger('CkApstraSession')
 
-        self.session = requests.Session()
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        self.session.verify = False
-        self.session.headers.update({'Content-Type': "application/json"})
+        self.transport = transport or CkApstraTransport(verify=self.ssl_verify)
+        # the underlying requests.Session. use the verb methods below to go through the transport
+        self.session = self.transport.session
+        # the accounting of every request. see CkRequestStats
+        self.stats = self.transport.stats
         self.url_prefix = f"https://{self.host}:{self.port}/api"
 
         self.login()
 
-        self.device_profile_cache = {} # { device_profile_id: data }
+        # device profiles and logical devices. replace it to persist the catalog
+        self.catalog = CkApstraDesignCatalog(self)
+        self.blueprint_summaries = None # { id: { id, label, version, design, ... } } from list_blueprints()
 
     def login(self) -> None:
         """
@@ -68,10 +42,34 @@ class CkApstraSession:
             "username": self.username,
             "password": self.password
         }
-        response = self.session.post(url, json=payload)
+        response = self.post(url, json=payload)
         # print(f"{response.raw=}")
         self.token = response.json()["token"]
-        self.session.headers.update({'AuthToken': self.token})
+        self.transport.update_headers({'AuthToken': self.token})
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request to the full url through the transport.
+        """
+        return self.transport.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def options(self, url: str, **kwargs) -> requests.Response:
+        return self.request('OPTIONS', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
 
     def get_device_profile(self, device_profile_name: str = None) -> dict:
         """
@@ -86,11 +84,7 @@ class CkApstraSession:
         if device_profile_name is None:
             self.logger.warning("name is None")
             return None
-        if device_profile_name not in self.device_profile_cache:
-            # url = f"{self.url_prefix}/device-profiles"
-            device_profiles = self.get_items('device-profiles')['items']
-            self.device_profile_cache[device_profile_name] = [ x for x in device_profiles if x['id'] == device_profile_name ][0]
-        return self.device_profile_cache[device_profile_name]
+        return self.catalog.get_device_profile(device_profile_name)
 
     def get_logical_device(self, id: int) -> dict:
         """
@@ -102,8 +96,7 @@ class CkApstraSession:
         Returns:
             The logical device, or None if the logical device does not exist.
         """
-        # url = f"{self.url_prefix}/design/logical-devices/{id}"
-        return self.get_items(f"design/logical-devices/{id}")
+        return self.catalog.get_logical_device(id)
 
     def get_items(self, url: str) -> dict:
         """
@@ -116,7 +109,7 @@ class CkApstraSession:
             The items
         """
         url = f"{self.url_prefix}/{url}"
-        return self.session.get(url).json()
+        return self.get(url).json()
 
     def patch_item(self, url: str, patch_spec: dict, params=None) -> dict:
         """
@@ -130,34 +123,32 @@ class CkApstraSession:
             The return
         """
         url = f"{self.url_prefix}/{url}"
-        self.logger.debug(f"patch_item({url}, {patch_spec})")
-        return self.session.patch(url, json=patch_spec, params=params).json()
+        self.logger.debug("patch_item(%s, %s)", url, CkLogPayload(patch_spec))
+        return self.patch(url, json=patch_spec, params=params).json()
 
-    def patch_throttled(self, url: str, spec: dict, params: None) -> dict:
+    def patch_throttled(self, url: str, spec: dict, params=None) -> dict:
         """
+        Patch the full url. HTTP 429 is retried by the rate limiter of the transport.
+
+        Returns:
+            The json of the response, or None if the response is empty
         """
-        throttle_seconds = 10
-        patched = self.session.patch(url, json=spec, params=params)
+        patched = self.patch(url, json=spec, params=params)
         try:
-            while True:
-                # http 429 too many requests
-                if patched.status_code != 429:                
-                    break
-                self.logger.info(f"sleeping {throttle_seconds} seconds due to: {patched.text}")
-                time.sleep(throttle_seconds)
-                patched = patched = self.session.patch(url, json=spec, params=params)
-                if patched.content:
-                    return patched.json()
-                else:
-                    return None
             if patched.content:
                 return patched.json()
             else:
                 return None
         except Exception as e:
-            self.logger.error(f"{spec=}, {patched.content=} {e=}")
+            self.logger.error("spec=%s, patched.content=%s e=%r", CkLogPayload(spec), CkLogPayload(patched.content), e)
             return None
 
+    def throttle_stats(self) -> dict:
+        """
+        Return the counters of the rate limiter. (ex. throttled_count, throttled_seconds)
+        """
+        return self.transport.rate_limiter.stats()
+
     def print_token(self) -> None:
         """
         Print the current authentication token.
@@ -172,7 +163,33 @@ class CkApstraSession:
             The list for blueprint id.
         """
         url = f"{self.url_prefix}/blueprints"
-        return self.session.options(url).json()['items']
+        return self.options(url).json()['items']
+
+    def list_blueprints(self, refresh: bool = False) -> list:
+        """
+        Get the summary of all the blueprints, cached from one listing call.
+        The summary has id, label, version, design, ... without the graph.
+
+        Returns:
+            The list of the blueprint summaries.
+        """
+        if refresh or self.blueprint_summaries is None:
+            items = self.get_items('blueprints')['items']
+            self.blueprint_summaries = {x['id']: x for x in items}
+        return list(self.blueprint_summaries.values())
+
+    def get_blueprint_summary(self, id: str = None, label: str = None) -> dict:
+        """
+        Get the summary of the blueprint by id or label. The listing is pulled again on miss.
+
+        Returns:
+            The summary, or None if the blueprint does not exist.
+        """
+        for refresh in [False, True]:
+            for summary in self.list_blueprints(refresh=refresh):
+                if (id and summary['id'] == id) or (not id and summary['label'] == label):
+                    return summary
+        return None
 
 if __name__ == "__main__":
     log_level = logging.DEBUG
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import contextlib
+import json
+import logging
+import re
+import threading
+from urllib.parse import urlsplit
+
+
+# per-request accounting of the controller calls
+class CkRequestStats:
+    """
+    Record every request with the endpoint template, verb, status, latency, sizes and
+    HTTP 429 retries, attributed to the current step.
+
+    Example:
+        with session.stats.step('a2-move-generic-systems'):
+            ...
+        session.stats.log_summary()
+        session.stats.write_json('request-stats.json')
+    """
+    NO_STEP = '-'
+    # the path segments following these are ids
+    ID_COLLECTIONS = frozenset([
+        'blueprints', 'nodes', 'virtual-networks', 'device-profiles', 'logical-devices',
+        'interface-maps', 'systems', 'obj-policy-application-points', 'endpoint-policies',
+    ])
+    UUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger('CkRequestStats')
+        self.current_step = self.NO_STEP
+        self.steps = []  # the step names in the order of the first request
+        # { step: { 'VERB /api/template': [ (status, seconds, request_bytes, response_bytes, throttled) ] } }
+        self.records = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def endpoint_template(cls, url: str) -> str:
+        """
+        Return the path of the url with the ids replaced by {id}
+
+        ex) https://host/api/blueprints/<uuid>/nodes/<node id>?async=full -> /api/blueprints/{id}/nodes/{id}
+        """
+        segments = urlsplit(url).path.split('/')
+        template = []
+        for index, segment in enumerate(segments):
+            if (index > 0 and segments[index - 1] in cls.ID_COLLECTIONS) or cls.UUID_PATTERN.match(segment):
+                template.append('{id}')
+            else:
+                template.append(segment)
+        return '/'.join(template)
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        """
+        Attribute the requests in the with block to the step
+        """
+        previous_step = self.current_step
+        self.current_step = name
+        try:
+            yield self
+        finally:
+            self.current_step = previous_step
+
+    def record(self, method: str, url: str, status_code, seconds: float, request_bytes: int = 0,
+               response_bytes: int = 0, throttled: int = 0) -> None:
+        """
+        Record a request. status_code is None if it raised.
+        """
+        endpoint = f"{method} {self.endpoint_template(url)}"
+        with self._lock:
+            step = self.current_step
+            if step not in self.records:
+                self.records[step] = {}
+                self.steps.append(step)
+            self.records[step].setdefault(endpoint, []).append((status_code, seconds, request_bytes, response_bytes, throttled))
+
+    @staticmethod
+    def _percentile(sorted_values: list, percent: float) -> float:
+        # nearest rank
+        if not sorted_values:
+            return 0.0
+        rank = max(1, -(-len(sorted_values) * percent // 100))
+        return sorted_values[int(rank) - 1]
+
+    @classmethod
+    def _summarize(cls, records: list) -> dict:
+        latencies = sorted(x[1] for x in records)
+        return {
+            'count': len(records),
+            'errors': sum(1 for x in records if x[0] is None or x[0] >= 400),
+            'throttled': sum(x[4] for x in records),
+            'seconds': round(sum(latencies), 3),
+            'p50_ms': round(cls._percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(cls._percentile(latencies, 95) * 1000, 1),
+            'request_bytes': sum(x[2] for x in records),
+            'response_bytes': sum(x[3] for x in records),
+        }
+
+    def summary(self, step: str = None) -> dict:
+        """
+        Return the summary per step and endpoint
+
+        Args:
+            step: The step to summarize. All the steps if None.
+
+        Returns:
+            { step: { 'total': {...}, 'endpoints': { 'VERB /api/template': {...} } } }
+                with count, errors, throttled, seconds, p50_ms, p95_ms, request_bytes, response_bytes
+        """
+        with self._lock:
+            steps = [step] if step is not None else list(self.steps)
+            records = {x: {k: list(v) for k, v in self.records.get(x, {}).items()} for x in steps}
+        summary = {}
+        for step_name, endpoints in records.items():
+            summary[step_name] = {
+                'total': self._summarize([x for v in endpoints.values() for x in v]),
+                'endpoints': {k: self._summarize(v) for k, v in sorted(endpoints.items(), key=lambda x: -len(x[1]))},
+            }
+        return summary
+
+    def log_summary(self, step: str = None) -> None:
+        """
+        Log the summary of the step, or of all the steps
+        """
+        for step_name, step_summary in self.summary(step).items():
+            total = step_summary['total']
+            self.logger.info(f"step {step_name}: {total['count']} requests, {total['errors']} errors, "
+                             f"{total['throttled']} throttled, {total['seconds']}s, "
+                             f"{total['request_bytes']}B sent, {total['response_bytes']}B received")
+            for endpoint, endpoint_summary in step_summary['endpoints'].items():
+                self.logger.info(f"    {endpoint}: {endpoint_summary['count']} requests, "
+                                 f"p50 {endpoint_summary['p50_ms']}ms, p95 {endpoint_summary['p95_ms']}ms, "
+                                 f"{endpoint_summary['errors']} errors, {endpoint_summary['throttled']} throttled")
+
+    def write_json(self, file_name: str) -> None:
+        """
+        Write the summary of all the steps to the json file
+        """
+        with open(file_name, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+        self.logger.info(f"request stats written to {file_name}")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+# span timeline of a run in the chrome trace event format
+class CkTracer:
+    """
+    Record the nested spans of the steps, the per-object operations and the HTTP calls, and
+    write them as chrome trace events to open in chrome://tracing or https://ui.perfetto.dev
+
+    It records nothing until enabled. The spans in a thread are nested by time. The spans of the
+    objects processed concurrently in one event loop are async spans keyed by async_id.
+
+    Example:
+        tracer.enable()
+        with tracer.span('a2-move-generic-systems', 'step'):
+            ...
+        tracer.write('trace.json')
+    """
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger('CkTracer')
+        self.enabled = False
+        self.events = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._thread_names = {}  # { thread id: thread name }
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _add(self, event: dict) -> None:
+        thread = threading.current_thread()
+        event['pid'] = self.pid
+        event['tid'] = thread.ident
+        with self._lock:
+            self._thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = 'function', async_id=None, **args):
+        """
+        Record the with block as a span
+
+        Args:
+            name: The name of the span.
+            category: The category. ex) step, object, http
+            async_id: The id of the async span, for the blocks overlapping in one thread.
+            args: The arguments shown with the span. The yielded dict can be updated in the block.
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = self._now_us()
+        if async_id is not None:
+            self.begin(name, category, async_id)
+        try:
+            yield args
+        finally:
+            if async_id is not None:
+                self.end(name, category, async_id, **args)
+            else:
+                self._add({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': self._now_us() - start, 'args': args})
+
+    def begin(self, name: str, category: str, async_id, **args) -> None:
+        """
+        Begin an async span. It can end in another call or thread.
+        """
+        if self.enabled:
+            self._add({'name': name, 'cat': category, 'ph': 'b', 'id': str(async_id), 'ts': self._now_us(), 'args': args})
+
+    def end(self, name: str, category: str, async_id, **args) -> None:
+        """
+        End the async span of the same name, category and async_id
+        """
+        if self.enabled:
+            self._add({'name': name, 'cat': category, 'ph': 'e', 'id': str(async_id), 'ts': self._now_us(), 'args': args})
+
+    def write(self, file_name: str) -> None:
+        """
+        Write the recorded events to the json file
+        """
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self._thread_names)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': thread_name}}
+            for tid, thread_name in thread_names.items()
+        ]
+        with open(file_name, 'w') as file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, file)
+        self.logger.info(f"{len(events)} trace events written to {file_name}")
+
+
+# the tracer of the process
+tracer = CkTracer()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import logging
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apstra_bp_consolidation.apstra_rate_limiter import CkRateLimiter
+from apstra_bp_consolidation.apstra_stats import CkRequestStats
+from apstra_bp_consolidation.apstra_trace import tracer
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
+
+
+# https transport to Apstra Controller
+class CkApstraTransport:
+    """
+    Pooled, retrying HTTP transport shared by the session and the blueprints.
+
+    It owns the requests.Session, an explicitly sized keep-alive connection pool,
+    per-verb timeouts, the retry policies and the rate limiter for all the verbs.
+    """
+    # (connect timeout, read timeout) in seconds
+    DEFAULT_TIMEOUTS = {
+        'GET': (5, 120),
+        'OPTIONS': (5, 60),
+        'HEAD': (5, 60),
+        'POST': (5, 300),
+        'PUT': (5, 300),
+        'PATCH': (5, 300),
+        'DELETE': (5, 120),
+    }
+    # the verbs which are safe to resend after the request reached the controller
+    IDEMPOTENT_METHODS = frozenset(['GET', 'OPTIONS', 'HEAD', 'PUT', 'DELETE'])
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, max_retries: int = 3,
+                 backoff_factor: float = 0.5, timeouts: dict = None, verify: bool = False,
+                 rate_limiter: CkRateLimiter = None, stats: CkRequestStats = None) -> None:
+        """
+        Initialize the transport.
+
+        Args:
+            pool_connections: The number of connection pools to cache (one per host).
+            pool_maxsize: The maximum number of kept-alive connections per host.
+            max_retries: The retries on connection errors, read errors and RETRY_STATUS.
+            backoff_factor: The exponential backoff factor between the retries.
+            timeouts: The { verb: (connect, read) } to override DEFAULT_TIMEOUTS.
+            verify: Verify the server certificate.
+            rate_limiter: The rate limiter to pace the requests and to retry HTTP 429.
+            stats: The accounting of the requests.
+        """
+        self.logger = logging.getLogger('CkApstraTransport')
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeouts = {**self.DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.rate_limiter = rate_limiter or CkRateLimiter()
+        self.stats = stats or CkRequestStats()
+
+        # connection errors are retried for every verb since the request was not sent.
+        # read errors and the status retries are limited to the idempotent verbs.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.session.verify = verify
+        self.session.headers.update({
+            'Content-Type': "application/json",
+            'Connection': 'keep-alive',
+        })
+
+    def update_headers(self, headers: dict) -> None:
+        """
+        Update the headers sent with every request. (ex. AuthToken)
+        """
+        self.session.headers.update(headers)
+
+    def request(self, method: str, url: str, retry_safe: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request through the pool.
+
+        Args:
+            method: The http verb.
+            url: The full url.
+            retry_safe: Resend a non-idempotent request on connection or read errors.
+                For the requests without side effect like qe.
+            kwargs: Passed to requests. The timeout defaults to the per-verb timeout.
+
+        Returns:
+            The response. It can be HTTP 429 when the rate limiter ran out of the attempts.
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeouts.get(method))
+        throttled_attempt = 0
+        start = time.monotonic()
+        response = None
+        with tracer.span(f"{method} {self.stats.endpoint_template(url)}", 'http', url=url) as span_args:
+            try:
+                while True:
+                    response = self._send(method, url, retry_safe, **kwargs)
+                    # http 429 too many requests
+                    if response.status_code != 429:
+                        self.rate_limiter.on_success()
+                        return response
+                    if throttled_attempt + 1 >= self.rate_limiter.max_attempts:
+                        self.logger.warning("%s %s still throttled after %s attempts: %s", method, url, throttled_attempt + 1, CkLogPayload(response.text))
+                        return response
+                    time.sleep(self.rate_limiter.on_throttled(response.headers.get('Retry-After'), throttled_attempt))
+                    throttled_attempt += 1
+            finally:
+                self._record(method, url, response, time.monotonic() - start, throttled_attempt)
+                span_args['status_code'] = response.status_code if response is not None else None
+                span_args['throttled'] = throttled_attempt
+
+    def _record(self, method: str, url: str, response: requests.Response, seconds: float, throttled: int) -> None:
+        if response is None:
+            self.stats.record(method, url, None, seconds, throttled=throttled)
+            return
+        body = response.request.body if response.request is not None else None
+        self.stats.record(method, url, response.status_code, seconds,
+                          request_bytes=len(body) if body else 0,
+                          response_bytes=len(response.content or b''),
+                          throttled=throttled)
+
+    def _send(self, method: str, url: str, retry_safe: bool, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # the adapter already retried the idempotent verbs
+                if not retry_safe or method in self.IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                backoff_seconds = self.backoff_factor * (2 ** (attempt - 1))
+                self.logger.warning(f"{method} {url} failed: {e!r}. retry {attempt}/{self.max_retries} in {backoff_seconds}s")
+                time.sleep(backoff_seconds)
+
+    def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
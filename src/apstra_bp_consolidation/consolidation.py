@@ -3,10 +3,13 @@
 import click
 import yaml
 import logging
+import contextlib
 
 from apstra_bp_consolidation.apstra_session import CkApstraSession
 from apstra_bp_consolidation.apstra_blueprint import CkApstraBlueprint
-from apstra_bp_consolidation.apstra_session import prep_logging
+from apstra_bp_consolidation.apstra_logging import prep_logging
+from apstra_bp_consolidation.apstra_catalog import CkApstraDesignCatalog
+from apstra_bp_consolidation.apstra_trace import tracer
 
 
 # # PLAN
@@ -82,7 +85,12 @@ class ConsolidationOrder:
 
         load_dotenv()
         log_level = os.getenv('logging_level')
-        prep_logging(log_level)
+        logging_queue = os.getenv('logging_queue', '').lower() in ['true', 'yes', '1']
+        logging_payload_max = int(os.getenv('logging_payload_max', 2000))
+        prep_logging(log_level, use_queue=logging_queue, payload_max_chars=logging_payload_max)
+        self.trace_file = os.getenv('trace_file')  # the chrome trace json file of the run
+        if self.trace_file:
+            tracer.enable()
 
         apstra_server_host = os.getenv('apstra_server_host')
         apstra_server_port = os.getenv('apstra_server_port')
@@ -97,14 +105,27 @@ class ConsolidationOrder:
             apstra_server_username,
             apstra_server_password,
             )
+        design_catalog_file = os.getenv('design_catalog_file')
+        if design_catalog_file:
+            design_catalog_ttl = os.getenv('design_catalog_ttl')
+            self.session.catalog = CkApstraDesignCatalog(
+                self.session,
+                cache_file=design_catalog_file,
+                ttl_seconds=design_catalog_ttl and float(design_catalog_ttl),
+                )
         self.main_bp_label = os.getenv('main_bp')
         self.tor_label = os.getenv('tor_bp')
         self.tor_name = os.getenv('tor_name')
         self.access_switch_interface_map_label = os.getenv('tor_im_new')
         self.config_dir = os.getenv('config_dir')  # for pull-configurations
+        self.ct_batch_payload_bytes = int(os.getenv('ct_batch_payload_bytes', 1024 * 1024))  # for move-cts
+        self.request_stats_file = os.getenv('request_stats_file')  # the json file of the per-step request summary
 
         self.main_bp = CkApstraBlueprint(self.session, self.main_bp_label)
         self.tor_bp = CkApstraBlueprint(self.session, self.tor_label)
+        if os.getenv('tor_bp_local_graph', '').lower() in ['true', 'yes', '1']:
+            # the tor blueprint is only read until the last step. serve the queries locally
+            self.tor_bp.load_graph()
         self.logger = logging.getLogger(f"ConsolidationOrder({self.main_bp.label}<-{self.tor_bp.label})")
 
         tor_switch_nodes = self.tor_bp.query("node('system', name='system', management_level='full_control')")
@@ -120,6 +141,29 @@ class ConsolidationOrder:
     def __repr__(self) -> str:
         return f"ConsolidationOrder({self.config_yaml_input_file=}, {self.config=}, {self.session=}, {self.main_bp=}, {self.tor_bp=}, {self.tor_label=}, {self.switch_label_pair=})"
     
+    @contextlib.contextmanager
+    def step(self, name: str):
+        """
+        Attribute the requests in the with block to the step, and log the summary of the step at the end
+        """
+        with self.session.stats.step(name), tracer.span(name, 'step'):
+            yield self
+        self.session.stats.log_summary(name)
+
+    def report_stats(self) -> None:
+        """
+        Log the request totals of all the steps, and write the summary to request_stats_file
+        and the spans to trace_file if set
+        """
+        for step_name, step_summary in self.session.stats.summary().items():
+            self.logger.info(f"requests of step {step_name}: {step_summary['total']}")
+        self.logger.info(f"throttle stats: {self.session.throttle_stats()}")
+        self.logger.info(f"query cache stats: main {self.main_bp.query_cache.stats()}, tor {self.tor_bp.query_cache.stats()}")
+        if self.request_stats_file:
+            self.session.stats.write_json(self.request_stats_file)
+        if self.trace_file:
+            tracer.write(self.trace_file)
+
     def rename_generic_system(self, generic_system_from_tor_bp: str) -> str:
         # rename the generic system in the main blueprint to avoid conflict
         # the maximum length is 32. Prefix 'r5r14-'
@@ -180,12 +224,11 @@ def order_collect_cabling_maps(order: ConsolidationOrder):
     cable_map_out_yaml_file = order.cabling_maps_yaml_file
 
     # iterate all the blueprints
-    bp_id_list = order.session.list_blueprint_ids()
-    for i in range(len(bp_id_list)):
-        bp_id = bp_id_list[i]
-        this_bp = CkApstraBlueprint(order.session, None, bp_id)
+    bp_list = order.session.list_blueprints()
+    for i in range(len(bp_list)):
+        this_bp = CkApstraBlueprint(order.session, None, bp_list[i]['id'])
         this_bp_label = this_bp.label
-        logging.debug(f"pulling cable map - {i+1}/{len(bp_id_list)} == {this_bp_label}")
+        logging.debug(f"pulling cable map - {i+1}/{len(bp_list)} == {this_bp_label}")
         cabling_maps[this_bp_label] = this_bp.get_cabling_maps()
         i += 1
 
@@ -195,7 +238,8 @@ def order_collect_cabling_maps(order: ConsolidationOrder):
     
 
 def pretty_yaml(data: dict, label: str) -> None:
-    logging.debug(f"==== {label}\n{yaml.dump(data)}\n====")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("==== %s\n%s\n====", label, yaml.dump(data))
 
 
 @click.command(name='move-all', help='run all the steps in sequence')
@@ -203,19 +247,26 @@ def move_all():
     order = ConsolidationOrder()
 
     from apstra_bp_consolidation.move_access_switch import order_move_access_switches
-    order_move_access_switches(order)
+    with order.step('a1-move-access-switches'):
+        order_move_access_switches(order)
 
     from apstra_bp_consolidation.move_generic_system import order_move_generic_systems
-    order_move_generic_systems(order)
+    with order.step('a2-move-generic-systems'):
+        order_move_generic_systems(order)
 
     from apstra_bp_consolidation.move_vn import order_move_virtual_networks
-    order_move_virtual_networks(order)
+    with order.step('a3-move-virtual-networks'):
+        order_move_virtual_networks(order)
 
     from apstra_bp_consolidation.move_ct import order_move_cts
-    order_move_cts(order)
+    with order.step('a4-move-cts'):
+        order_move_cts(order)
 
     from apstra_bp_consolidation.move_device import order_move_devices
-    order_move_devices(order)
+    with order.step('a6-move-devices'):
+        order_move_devices(order)
+
+    order.report_stats()
 
     
 
@@ -23,10 +23,10 @@ def order_find_missing_vn(order):
         vni in main_vni_list or main_vni_list.append(vni)
     logging.info(f"{len(main_vni_list)=}")
 
-    bp_list = order.session.list_blueprint_ids()
-    logging.debug(f"{bp_list=}")
-    for bp_id in bp_list:
-        this_bp = CkApstraBlueprint(order.session, None, bp_id)
+    bp_list = order.session.list_blueprints()
+    logging.debug(f"{[x['label'] for x in bp_list]=}")
+    for bp_summary in bp_list:
+        this_bp = CkApstraBlueprint(order.session, None, bp_summary['id'])
         logging.debug(f"checking BP {this_bp.label}")
         this_vni_nodes = this_bp.query(all_vn_query)
         missing_vns = []
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 
 import json
-import time
 import logging
 import click
 
 from apstra_bp_consolidation.consolidation import ConsolidationOrder
 from apstra_bp_consolidation.consolidation import prep_logging
 from apstra_bp_consolidation.apstra_blueprint import CkEnum
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
 
 def build_access_switch_fabric_links_dict(a_link_nodes:dict) -> dict:
     '''
@@ -79,51 +79,23 @@ def remove_old_generic_system_from_main(order, tor_ae_id_in_main, tor_interface_
     
     # remove the connectivity templates assigned to the generic system
     cts_to_remove = order.main_bp.get_interface_cts(tor_ae_id_in_main)
-
-    # damping CTs in chunks
-    while len(cts_to_remove) > 0:
-        throttle_number = 50
-        cts_chunk = cts_to_remove[:throttle_number]
-        logging.debug(f"Removing Connecitivity Templates on this links: {len(cts_chunk)=}")
-        batch_ct_spec = {
-            "operations": [
-                {
-                    "path": "/obj-policy-batch-apply",
-                    "method": "PATCH",
-                    "payload": {
-                        "application_points": [
-                            {
-                                "id": tor_ae_id_in_main,
-                                "policies": [ {"policy": x, "used": False} for x in cts_chunk]
-                            }
-                        ]
-                    }
-                }
-            ]
-        }
-        batch_result = order.main_bp.batch(batch_ct_spec, params={"comment": "batch-api"})
-        del cts_to_remove[:throttle_number]
-
-    # remove the generic system (links)
-    link_remove_spec = {
-        "operations": [
-            {
-                "path": "/delete-switch-system-links",
-                "method": "POST",
-                "payload": {
-                    "link_ids": [ x['link']['id'] for x in tor_interface_nodes_in_main ]
-                }
-            }
-        ]
-    }
-    batch_result = order.main_bp.batch(link_remove_spec, params={"comment": "batch-api"})
-    logging.debug(f"{link_remove_spec=}")
-    while True:
-        if_generic_system_present = order.main_bp.query(f"node('system', label='{order.tor_label}')")
-        if len(if_generic_system_present) == 0:
-            break
-        logging.info(f"{if_generic_system_present=}")
-        time.sleep(3)
+    logging.debug(f"Removing Connecitivity Templates on this links: {len(cts_to_remove)=}")
+
+    # the operations run in order within a batch. the CTs are detached before the links are removed
+    with order.main_bp.batch_builder() as batch:
+        batch.add_policy_apply(tor_ae_id_in_main, cts_to_remove, used=False)
+        # remove the generic system (links)
+        batch.add_delete_links([ x['link']['id'] for x in tor_interface_nodes_in_main ])
+    for failed in batch.failed():
+        logging.error("batch operation failed: %s", CkLogPayload(failed))
+    generic_system_gone = order.main_bp.wait_for_query(
+        f"node('system', label='{order.tor_label}')",
+        predicate=lambda items: len(items) == 0,
+        timeout=300,
+        description=f"{order.tor_label} to be removed")
+    if generic_system_gone is None:
+        logging.error(f"{order.tor_label} is still present in {order.main_bp.label}")
+        return
     # the generic system is gone.            
 
     return
@@ -152,18 +124,20 @@ def create_new_access_switch_pair(order, switch_pair_spec):
     logging.info(f"{access_switch_pair_created=}")
 
     # wait for the new system to be created
-    while True:
-        new_systems = order.main_bp.query(f"""
-            node('link', label='{access_switch_pair_created[0]}', name='link')
-            .in_().node('interface')
-            .in_().node('system', name='leaf')
-            .out().node('redundancy_group', name='{REDUNDANCY_GROUP}'
-            )""", multiline=True)
+    new_systems = order.main_bp.wait_for_query(f"""
+        node('link', label='{access_switch_pair_created[0]}', name='link')
+        .in_().node('interface')
+        .in_().node('system', name='leaf')
+        .out().node('redundancy_group', name='{REDUNDANCY_GROUP}'
+        )""",
         # There should be 5 links (including the peer link)
-        if len(new_systems) == 2:
-            break
-        logging.info(f"Waiting for new systems to be created: {len(new_systems)=}")
-        time.sleep(3)
+        predicate=lambda items: len(items) == 2,
+        multiline=True,
+        timeout=300,
+        description="new access switch pair")
+    if new_systems is None:
+        logging.error(f"the new access switch pair is not created in {order.main_bp.label}")
+        return
 
     # The first entry is the peer link
 
@@ -209,7 +183,9 @@ def get_tor_ae_id_in_main(tor_interface_nodes_in_main, tor_name):
 @click.command(name='a1-move-access-switches', help='step 1 - replace the generic system in main blueprint with the access switch pair from tor blueprint')
 def click_move_access_switches():    
     order = ConsolidationOrder()
-    order_move_access_switches(order)
+    with order.step('a1-move-access-switches'):
+        order_move_access_switches(order)
+    order.report_stats()
 
 def order_move_access_switches(order):
     logging.info(f"======== Moving Access Switches for {order.switch_label_pair} from {order.tor_bp.label} to {order.main_bp.label}")
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import logging
-import copy
 import uuid
 from typing import Any
 # from typing import List, Optional
@@ -10,6 +9,74 @@ from pydantic import BaseModel
 from apstra_bp_consolidation.consolidation import ConsolidationOrder
 
 from apstra_bp_consolidation.apstra_blueprint import CkEnum
+from apstra_bp_consolidation.vlan_set import CkVlanSet
+from apstra_bp_consolidation.apstra_trace import tracer
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
+
+
+def pull_interface_ownership(the_bp, switch_label_pair: list) -> tuple:
+    """
+    Pull the interfaces of the switch pair with the EVPN membership, one row per interface
+
+    Return tuple of
+        hosted_interfaces: { <interface id>: (<system_label>, <if_name>) }
+        evpn_members: { <evpn interface id>: { <system_label>: set(<member if_name>) } }
+    """
+    SWITCH_NODE = 'switch'
+    INTERFACE_NODE = 'interface'
+    EVPN_INTERFACE_NODE = 'evpn-interface'
+
+    ownership_query = f"""
+        match(
+            node('system', label=is_in({switch_label_pair}), name='{SWITCH_NODE}')
+                .out('hosted_interfaces').node('interface', name='{INTERFACE_NODE}'),
+            optional(
+                node('interface', po_control_protocol='evpn', name='{EVPN_INTERFACE_NODE}')
+                    .out('composed_of').node('interface')
+                    .out('composed_of').node(name='{INTERFACE_NODE}')
+                )
+        )
+    """
+    hosted_interfaces = {}
+    evpn_members = {}
+    for nodes in the_bp.query(ownership_query, multiline=True):
+        system_label = nodes[SWITCH_NODE]['label']
+        if_name = nodes[INTERFACE_NODE]['if_name']
+        hosted_interfaces[nodes[INTERFACE_NODE]['id']] = (system_label, if_name)
+        if nodes[EVPN_INTERFACE_NODE]:
+            evpn_members.setdefault(nodes[EVPN_INTERFACE_NODE]['id'], {}).setdefault(system_label, set()).add(if_name)
+    return (hosted_interfaces, evpn_members)
+
+
+def fold_interface_vlan_facts(fact_rows, hosted_interfaces: dict, evpn_members: dict) -> tuple:
+    """
+    Fold the (interface, single VLAN CT) rows into the VLAN sets of the interfaces
+
+    Args:
+        fact_rows: The list of { interface, AttachSingleVLAN, virtual_network } rows from the query
+        hosted_interfaces: The interfaces of the switches from pull_interface_ownership
+        evpn_members: The EVPN memberships from pull_interface_ownership
+
+    Return tuple of
+        vlan_facts: { <interface id>: { tagged: CkVlanSet, untagged: <vlan_id> } }
+        folded_count: The number of the rows of the switch pair interfaces, folded into vlan_facts
+    """
+    vlan_facts = {}
+    folded_count = 0
+    for nodes in fact_rows:
+        interface_id = nodes['interface']['id']
+        if interface_id not in hosted_interfaces and interface_id not in evpn_members:
+            # not an interface of the switch pair
+            continue
+        folded_count += 1
+        vlan_id = int(nodes['virtual_network']['vn_id']) - 100000
+        is_tagged = 'vlan_tagged' in nodes['AttachSingleVLAN']['attributes']
+        this_fact = vlan_facts.setdefault(interface_id, {'tagged': CkVlanSet(), 'untagged': None})
+        if is_tagged:
+            this_fact['tagged'].add(vlan_id)
+        else:
+            this_fact['untagged'] = vlan_id
+    return (vlan_facts, folded_count)
 
 
 def pull_interface_vlan_table(the_bp, switch_label_pair: list) -> dict:
@@ -20,11 +87,11 @@ def pull_interface_vlan_table(the_bp, switch_label_pair: list) -> dict:
     <system_label>:
         <if_name>:
             id: None
-            tagged_vlans: []
+            tagged_vlans: CkVlanSet
             untagged_vlan: None
     redundacy_group:
         <ae_id>:
-            tagged_vlans: []
+            tagged_vlans: CkVlanSet
             untagged_vlan: None
             member_interfaces:
                 <system_label>: [ <member if_name> ]   
@@ -33,11 +100,11 @@ def pull_interface_vlan_table(the_bp, switch_label_pair: list) -> dict:
         # atl1tor-r5r14a:
         #     xe-0/0/0:
         #         id: <interface id>
-        #         tagged_vlans: []
+        #         tagged_vlans: CkVlanSet
         #         untagged_vlan: None
         CkEnum.REDUNDANCY_GROUP: {
             # <ae_id>:
-            #     tagged_vlans: []
+            #     tagged_vlans: CkVlanSet
             #     untagged_vlan: None
             #     member_interfaces:
             #         <system_label>: [ <member if_name> ]             
@@ -50,6 +117,8 @@ def pull_interface_vlan_table(the_bp, switch_label_pair: list) -> dict:
     SINGLE_VLAN_NODE = 'AttachSingleVLAN'
     VN_NODE = 'virtual_network'
 
+    # one row per (interface, VLAN, tagging). The membership of the interface is pulled separately
+    # to avoid the cross product with the member interfaces
     interface_vlan_query = f"""
         match(
             node('ep_endpoint_policy', policy_type_name='batch', name='{CT_NODE}')
@@ -58,70 +127,38 @@ def pull_interface_vlan_table(the_bp, switch_label_pair: list) -> dict:
                 .in_('ep_member_of').node(name='{INTERFACE_NODE}'),
             node(name='ep_application_instance')
                 .out('ep_nested').node('ep_endpoint_policy', policy_type_name='AttachSingleVLAN', name='{SINGLE_VLAN_NODE}')
-                .out('vn_to_attach').node('virtual_network', name='virtual_network'),
-            optional(
-                node(name='{INTERFACE_NODE}')
-                .out('composed_of').node('interface')
-                .out('composed_of').node('interface', name='{CkEnum.MEMBER_INTERFACE}')
-                .in_('hosted_interfaces').node('system', label=is_in({switch_label_pair}), name='{CkEnum.MEMBER_SWITCH}' )
-                ),
-            optional(
-                node(name='interface')
-                .in_('hosted_interfaces').node('system', label=is_in({switch_label_pair}), name='switch')
-                )            
-        )
+                .out('vn_to_attach').node('virtual_network', name='{VN_NODE}')
+        ).distinct(['{INTERFACE_NODE}', '{SINGLE_VLAN_NODE}', '{VN_NODE}'])
     """
 
-    interface_vlan_nodes = the_bp.query(interface_vlan_query, multiline=True)
-    logging.debug(f"BP:{the_bp.label} {len(interface_vlan_nodes)=}")
-    # why so many (3172) entries?
-
-    for nodes in interface_vlan_nodes:
-        if nodes[CkEnum.MEMBER_INTERFACE]:
-            # INTERFACE_NODE is EVPN
-            evpn_id = nodes[INTERFACE_NODE]['id']
-            system_label = nodes[CkEnum.MEMBER_SWITCH]['label']
-            if_name = nodes[CkEnum.MEMBER_INTERFACE]['if_name']
-            if if_name in ['et-0/0/48', 'et-0/0/49']:
+    hosted_interfaces, evpn_members = pull_interface_ownership(the_bp, switch_label_pair)
+    fact_rows = the_bp.query(interface_vlan_query, multiline=True)
+    vlan_facts, folded_count = fold_interface_vlan_facts(fact_rows, hosted_interfaces, evpn_members)
+    logging.debug(f"BP:{the_bp.label} received {len(fact_rows)} rows, folded {folded_count} rows "
+                  f"of {len(hosted_interfaces)} interfaces and {len(evpn_members)} EVPN interfaces")
+
+    for interface_id, this_fact in vlan_facts.items():
+        if interface_id in evpn_members:
+            member_interfaces = {}
+            for system_label, if_names in evpn_members[interface_id].items():
                 # skip et-0/0/48 and et-0/0/49 which will be taken care of by Apstra
+                if_names = sorted(x for x in if_names if x not in ['et-0/0/48', 'et-0/0/49'])
+                if if_names:
+                    member_interfaces[system_label] = if_names
+            if not member_interfaces:
                 continue
-            vlan_id = int(nodes[VN_NODE]['vn_id'] )- 100000
-            is_tagged = 'vlan_tagged' in nodes[SINGLE_VLAN_NODE]['attributes']
-            if evpn_id not in interface_vlan_table[CkEnum.REDUNDANCY_GROUP]:
-                interface_vlan_table[CkEnum.REDUNDANCY_GROUP][evpn_id] = {
-                    CkEnum.TAGGED_VLANS: [],
-                    CkEnum.UNTAGGED_VLAN: None,
-                    CkEnum.MEMBER_INTERFACE: {}
-                }
-            this_evpn_interface_data = interface_vlan_table[CkEnum.REDUNDANCY_GROUP][evpn_id]
-            if system_label not in this_evpn_interface_data[CkEnum.MEMBER_INTERFACE]:
-                this_evpn_interface_data[CkEnum.MEMBER_INTERFACE][system_label] = []
-            if if_name not in this_evpn_interface_data[CkEnum.MEMBER_INTERFACE][system_label]:
-                this_evpn_interface_data[CkEnum.MEMBER_INTERFACE][system_label].append(if_name)
-            if is_tagged:
-                # add vlan_id if not already in the list
-                if vlan_id not in this_evpn_interface_data[CkEnum.TAGGED_VLANS]:
-                    this_evpn_interface_data[CkEnum.TAGGED_VLANS].append(vlan_id)
-            else:
-                this_evpn_interface_data[CkEnum.UNTAGGED_VLAN] = vlan_id
+            interface_vlan_table[CkEnum.REDUNDANCY_GROUP][interface_id] = {
+                CkEnum.TAGGED_VLANS: this_fact['tagged'],
+                CkEnum.UNTAGGED_VLAN: this_fact['untagged'],
+                CkEnum.MEMBER_INTERFACE: member_interfaces,
+            }
         else:
-            system_label = nodes['switch']['label']
-            if_name = nodes['interface']['if_name']
-            vlan_id = int(nodes['virtual_network']['vn_id'] )- 100000
-            is_tagged = 'vlan_tagged' in nodes[SINGLE_VLAN_NODE]['attributes']
-            if system_label not in interface_vlan_table:
-                interface_vlan_table[system_label] = {}
-            if if_name not in interface_vlan_table[system_label]:
-                interface_vlan_table[system_label][if_name] = {
-                    'id': nodes['interface']['id'],
-                    CkEnum.TAGGED_VLANS: [],
-                    CkEnum.UNTAGGED_VLAN: None,
-                }
-            this_interface_data = interface_vlan_table[system_label][if_name]
-            if is_tagged:
-                this_interface_data[CkEnum.TAGGED_VLANS].append(vlan_id)
-            else:
-                this_interface_data[CkEnum.UNTAGGED_VLAN] = vlan_id
+            system_label, if_name = hosted_interfaces[interface_id]
+            interface_vlan_table.setdefault(system_label, {})[if_name] = {
+                'id': interface_id,
+                CkEnum.TAGGED_VLANS: this_fact['tagged'],
+                CkEnum.UNTAGGED_VLAN: this_fact['untagged'],
+            }
 
     summary = [f"{x}:{len(interface_vlan_table[x])}" for x in interface_vlan_table.keys()]
     logging.debug(f"BP:{the_bp.label} {summary=}")
@@ -153,18 +190,10 @@ class VniCt:
             self.untagged_id = ct_id
     
     def get_id(self, is_tagged:bool = True):
-        if is_tagged:
-            if self.tagged_id is None:
-                self.logger.warning(f"tagged_id is None")
-                self.tagged_id = self.bp.add_single_vlan_ct(self.vni, is_tagged)
-                self.logger.warning(f"{self.tagged_id=}")
-            return self.tagged_id
-        else:
-            if self.untagged_id is None:
-                self.logger.warning(f"untagged_id is None")
-                self.untagged_id = self.bp.add_single_vlan_ct(self.vni, is_tagged)
-                self.logger.warning(f"{self.untagged_id=}")
-            return self.untagged_id
+        """
+        Return the CT id, or None if the CT does not exist. The missing CTs are created in bulk by associate_cts().
+        """
+        return self.tagged_id if is_tagged else self.untagged_id
 
 
 def get_vni_2_ct_id_table(the_bp) -> dict:
@@ -200,9 +229,35 @@ def get_vni_2_ct_id_table(the_bp) -> dict:
 
     return vni_2_ct_id_table
 
+def copy_interface_vlan_entry(intf_data: dict) -> dict:
+    """
+    Return a copy of an entry of the interface vlan table, not sharing the VLAN set nor the member interfaces
+    """
+    entry = dict(intf_data)
+    if entry.get(CkEnum.TAGGED_VLANS) is not None:
+        entry[CkEnum.TAGGED_VLANS] = CkVlanSet(entry[CkEnum.TAGGED_VLANS])
+    if CkEnum.MEMBER_INTERFACE in entry:
+        entry[CkEnum.MEMBER_INTERFACE] = {x: list(y) for x, y in entry[CkEnum.MEMBER_INTERFACE].items()}
+    return entry
+
+
 def update_interface_id(the_bp, interface_vlan_table, switch_label_pair: list) -> dict:
-    # deepcopy to avoid mutation
-    interface_id_vlan_table = copy.deepcopy(interface_vlan_table)
+    """
+    Return the interface vlan table annotated with the interface ids of the blueprint
+
+    The entries are copied. The input table is not mutated.
+    """
+    interface_id_vlan_table = {
+        system_label: {if_name: copy_interface_vlan_entry(intf_data) for if_name, intf_data in system_data.items()}
+        for system_label, system_data in interface_vlan_table.items()
+    }
+    # (system_label, member if_name) to the AE entry
+    member_2_ae = {
+        (system_label, if_name): ae_data
+        for ae_data in interface_id_vlan_table[CkEnum.REDUNDANCY_GROUP].values()
+        for system_label, if_names in ae_data[CkEnum.MEMBER_INTERFACE].items()
+        for if_name in if_names
+    }
 
     EVPN_INTERFACE_NODE = 'evpn-interface'
     MEMBER_SWITCH_NODE = 'switch'
@@ -225,23 +280,83 @@ def update_interface_id(the_bp, interface_vlan_table, switch_label_pair: list) -
         if_name = nodes[MEMBER_INTERFACE_NODE]['if_name']
         if nodes[EVPN_INTERFACE_NODE]:
             # the node is not null - it is an EVPN interface
-            evpn_id = nodes[EVPN_INTERFACE_NODE]['id']
-            # loop through the interface_vlan_table to update
-            for ae_id, ae_data in interface_id_vlan_table[CkEnum.REDUNDANCY_GROUP].items():
-                if system_label in ae_data[CkEnum.MEMBER_INTERFACE]:
-                    if if_name in ae_data[CkEnum.MEMBER_INTERFACE][system_label]:
-                        ae_data['id'] = evpn_id
-                        break
+            ae_data = member_2_ae.get((system_label, if_name))
+            if ae_data is not None:
+                ae_data['id'] = nodes[EVPN_INTERFACE_NODE]['id']
         else:
             # no EVPN_INTERFACE_NODE - non-LAG interface
-            if if_name in interface_vlan_table[system_label]:
+            intf_data = interface_id_vlan_table.get(system_label, {}).get(if_name)
+            if intf_data is not None:
                 # skip if the interface does not have vlan assignment
-                interface_id_vlan_table[system_label][if_name]['id'] = nodes[MEMBER_INTERFACE_NODE]['id']
+                intf_data['id'] = nodes[MEMBER_INTERFACE_NODE]['id']
     return interface_id_vlan_table
 
 
-def associate_cts(the_bp, interface_vlan_table, switch_label_pair: list):
+def gather_vlan_assignments(interface_id_vlan_table: dict) -> dict:
+    """
+    Gather the single VLAN CTs to apply on all the interfaces
+
+    Return: dict {
+        <interface id>: [ (<vni>, <is_tagged>) ]
+    }
+    """
+    vlan_assignments = {}
+    for system_label, system_data in interface_id_vlan_table.items():
+        for intf_label, intf_data in system_data.items():
+            if 'id' not in intf_data:
+                logging.warning(f"skipping {system_label}:{intf_label} - interface id not found")
+                continue
+            vni_list = [(100000+x, True) for x in intf_data[CkEnum.TAGGED_VLANS]]
+            if intf_data[CkEnum.UNTAGGED_VLAN]:
+                # if untagged vlan is configure
+                vni_list.append((100000+intf_data[CkEnum.UNTAGGED_VLAN], False))
+            vlan_assignments[intf_data['id']] = vni_list
+    return vlan_assignments
+
+
+def diff_interface_cts(desired_cts: dict, current_cts: dict, single_vlan_ct_ids: set) -> tuple:
+    """
+    Compute the CT changes of the interfaces to reach the desired CTs
+
+    Only the single VLAN CTs are removed. The other CTs attached now are kept.
+
+    Args:
+        desired_cts: { <interface id>: [ <CT id> ] }
+        current_cts: { <interface id>: set(<CT id>) } attached now
+        single_vlan_ct_ids: The ids of the single VLAN CTs of the blueprint
+
+    Return tuple of
+        changes: { <interface id>: ( [ <CT id to add> ], [ <CT id to remove> ] ) } of the changed interfaces
+        unchanged_count: The number of the interfaces without change
+    """
+    changes = {}
+    unchanged_count = 0
+    for interface_id, ct_id_list in desired_cts.items():
+        current = current_cts.get(interface_id, set())
+        to_add = [x for x in ct_id_list if x not in current]
+        to_remove = sorted((current & single_vlan_ct_ids) - set(ct_id_list))
+        if not to_add and not to_remove:
+            unchanged_count += 1
+            continue
+        changes[interface_id] = (to_add, to_remove)
+    return (changes, unchanged_count)
+
+
+def associate_cts(the_bp, interface_vlan_table, switch_label_pair: list, max_payload_bytes: int = 1024 * 1024, reconcile: bool = False) -> list:
     """
+    Apply the single VLAN CTs on the interfaces, packing the application points of all the
+    interfaces into a few obj-policy-batch-apply operations
+
+    Args:
+        the_bp: The main blueprint
+        interface_vlan_table: The table from pull_interface_vlan_table
+        switch_label_pair: The access switch pair
+        max_payload_bytes: The payload budget of a /batch request
+        reconcile: Push only the difference from the CTs attached now.
+            Only the single VLAN CTs are removed.
+
+    Returns:
+        The ids of the application points failed to apply
     """
     # switch_interface_nodes = the_bp.get_switch_interface_nodes(switch_label_pair)
     vni_2_ct_id_table = get_vni_2_ct_id_table(the_bp)
@@ -256,71 +371,119 @@ def associate_cts(the_bp, interface_vlan_table, switch_label_pair: list):
     <system_label>:
         <if_name>:
             id: <interface id>
-            tagged_vlans: []
+            tagged_vlans: CkVlanSet
             untagged_vlan: None
     redundacy_group:
         <tor_ae_id>:
             id: <ae_id>
-            tagged_vlans: []
+            tagged_vlans: CkVlanSet
             untagged_vlan: None
             member_interfaces:
                 <system_label>: [ <member if_name> ]   
     """
+    vlan_assignments = gather_vlan_assignments(interface_id_vlan_table)
+
+    # create all the missing CTs in one request before applying them
+    missing_cts = set()
+    for vni_list in vlan_assignments.values():
+        for vni, is_tagged in vni_list:
+            vni_ct = vni_2_ct_id_table.get(vni)
+            if vni_ct is None or (vni_ct.tagged_id if is_tagged else vni_ct.untagged_id) is None:
+                missing_cts.add((vni, is_tagged))
+    if missing_cts:
+        created_cts = the_bp.add_single_vlan_cts(missing_cts)
+        logging.info(f"created {len(created_cts)} of {len(missing_cts)} missing CTs")
+        for (vni, is_tagged), ct_id in created_cts.items():
+            vni = int(vni)
+            if vni not in vni_2_ct_id_table:
+                vni_2_ct_id_table[vni] = VniCt(the_bp, vni)
+            vni_2_ct_id_table[vni].set_id(ct_id, is_tagged)
+
+    desired_cts = {}  # { <interface id>: [ <CT id> ] }
+    for interface_id, vni_list in vlan_assignments.items():
+        ct_id_list = []
+        missing_vnis = []
+        for vni, is_tagged in vni_list:
+            vni_ct = vni_2_ct_id_table.get(vni)
+            ct_id = vni_ct.get_id(is_tagged) if vni_ct else None
+            if ct_id is None:
+                missing_vnis.append(vni)
+            else:
+                ct_id_list.append(ct_id)
+        if missing_vnis:
+            logging.warning(f"{interface_id=} missing CTs of {missing_vnis}")
+        desired_cts[interface_id] = ct_id_list
+
+    # the application points of all the interfaces are packed into a few /batch requests
+    if reconcile:
+        current_cts = the_bp.get_interfaces_cts(desired_cts.keys())
+        single_vlan_ct_ids = set(x.tagged_id for x in vni_2_ct_id_table.values()) | set(x.untagged_id for x in vni_2_ct_id_table.values())
+        single_vlan_ct_ids.discard(None)
+        ct_id_2_vlan_id = {}
+        for vni, vni_ct in vni_2_ct_id_table.items():
+            for ct_id in [vni_ct.tagged_id, vni_ct.untagged_id]:
+                if ct_id:
+                    ct_id_2_vlan_id[ct_id] = vni - 100000
+        added_count = 0
+        removed_count = 0
+        added_vlans = CkVlanSet()
+        removed_vlans = CkVlanSet()
+        changes, unchanged_count = diff_interface_cts(desired_cts, current_cts, single_vlan_ct_ids)
+        with the_bp.batch_builder(max_payload_bytes=max_payload_bytes) as batch:
+            for interface_id, (to_add, to_remove) in changes.items():
+                batch.add_policy_changes(interface_id, attach=to_add, detach=to_remove)
+                added_count += len(to_add)
+                removed_count += len(to_remove)
+                interface_added_vlans = CkVlanSet(ct_id_2_vlan_id[x] for x in to_add if x in ct_id_2_vlan_id)
+                interface_removed_vlans = CkVlanSet(ct_id_2_vlan_id[x] for x in to_remove)
+                logging.debug("interface_id=%s adding vlans %s, removing vlans %s", interface_id, interface_added_vlans, interface_removed_vlans)
+                added_vlans |= interface_added_vlans
+                removed_vlans |= interface_removed_vlans
+        logging.info(f"reconciled {len(desired_cts)} interfaces: {added_count} CTs added, {removed_count} CTs removed, "
+                     f"{unchanged_count} interfaces unchanged, in {batch.request_count} batch requests")
+        logging.info(f"vlans added: {added_vlans.to_range_string()}, vlans removed: {removed_vlans.to_range_string()}")
+    else:
+        policy_count = 0
+        with the_bp.batch_builder(max_payload_bytes=max_payload_bytes) as batch:
+            for interface_id, ct_id_list in desired_cts.items():
+                # an application point without policy is a no-op
+                if not ct_id_list:
+                    continue
+                batch.add_policy_apply(interface_id, ct_id_list)
+                policy_count += len(ct_id_list)
+        logging.info(f"applied {policy_count} CTs on {len(desired_cts)} interfaces in {batch.request_count} batch requests")
+
+    failed_application_points = []
+    for failed in batch.failed():
+        logging.error("batch operation failed: status_code=%s result=%s", failed['status_code'], CkLogPayload(failed['result']))
+        failed_application_points.extend(failed['application_points'])
+    if failed_application_points:
+        logging.error("%s application points failed: %s", len(failed_application_points), CkLogPayload(failed_application_points))
+    return failed_application_points
 
-    for system_label, system_data in interface_id_vlan_table.items():
-        for intf_label, intf_data in system_data.items():
-            interface_id = intf_data['id']
-            # logging.debug(f"{system_label=}, {intf_label=}, {interface_id=}, {intf_data[CkEnum.TAGGED_VLANS]=}")
-            ct_id_list = []
-            for i in intf_data[CkEnum.TAGGED_VLANS]:
-                # logging.debug(f"{i=}, {vni_2_ct_id_table[100000+i]=}")
-                ct_id_list.append(vni_2_ct_id_table[100000+i].get_id())
-            # ct_id_list = [ vni_2_ct_id_table[100000+x].get_id() for x in intf_data[CkEnum.TAGGED_VLANS] ]
-            if intf_data[CkEnum.UNTAGGED_VLAN]:
-                # if untagged vlan is configure
-                ct_id_list.append(vni_2_ct_id_table[100000+intf_data[CkEnum.UNTAGGED_VLAN]].get_id(False))
-
-            while len(ct_id_list) > 0:
-                throttle_number = 50
-                cts_chunk = ct_id_list[:throttle_number]
-                # logging.debug(f"Adding Connecitivity Templates on this links: {len(cts_chunk)=}")
-                batch_ct_spec = {
-                    "operations": [
-                        {
-                            "path": "/obj-policy-batch-apply",
-                            "method": "PATCH",
-                            "payload": {
-                                "application_points": [
-                                    {
-                                        "id": interface_id,
-                                        "policies": [ {"policy": x, "used": True} for x in cts_chunk]
-                                    }
-                                ]
-                            }
-                        }
-                    ]
-                }
-                batch_result = the_bp.batch(batch_ct_spec, params={"comment": "batch-api"})
-                del ct_id_list[:throttle_number]
-        
 
 import click
 @click.command(name='a4-move-cts', help='step 4 - assign CTs to new generic systems')
-def click_move_cts():
+@click.option('--reconcile', is_flag=True, default=False, help='push only the difference from the CTs attached now')
+def click_move_cts(reconcile: bool):
     order = ConsolidationOrder()
-    order_move_cts(order)
+    with order.step('a4-move-cts'):
+        order_move_cts(order, reconcile=reconcile)
+    order.report_stats()
 
 
 
-def order_move_cts(order):
+def order_move_cts(order, reconcile: bool = False):
     logging.info(f"======== Moving Connectivity Templated for {order.switch_label_pair} from {order.tor_bp.label} to {order.main_bp.label}")
     ########
     # pull CT assignment data
 
-    interface_vlan_table = pull_interface_vlan_table(order.tor_bp, order.switch_label_pair)
+    with tracer.span('pull_interface_vlan_table'):
+        interface_vlan_table = pull_interface_vlan_table(order.tor_bp, order.switch_label_pair)
     # pretty_yaml(interface_vlan_table, "interface_vlan_table")
 
-    associate_cts(order.main_bp, interface_vlan_table, order.switch_label_pair)
+    with tracer.span('associate_cts', reconcile=reconcile):
+        associate_cts(order.main_bp, interface_vlan_table, order.switch_label_pair, max_payload_bytes=order.ct_batch_payload_bytes, reconcile=reconcile)
 
 
 if __name__ == '__main__':
@@ -8,7 +8,9 @@ from apstra_bp_consolidation.consolidation import ConsolidationOrder
 @click.command(name='a6-move-devices', help='setp 6 - undeploy device from tor blueprint and deploy to main blueprint')
 def click_move_devices():
     order = ConsolidationOrder()
-    order_move_devices(order)
+    with order.step('a6-move-devices'):
+        order_move_devices(order)
+    order.report_stats()
 
 
 def order_move_devices(order):
@@ -17,6 +19,8 @@ def order_move_devices(order):
     # 
     system_snapshot = {} # label: sn
     remove_spec = []
+    # the devices can be assigned out of this run. read the current system_id
+    order.tor_bp.inventory.refresh()
     for switch_label in order.switch_label_pair:
         systems_got = order.tor_bp.get_system_node_from_label(switch_label)
         id = systems_got['id']
@@ -3,10 +3,11 @@
 import json
 import logging
 import click
-import time
 
 from apstra_bp_consolidation.consolidation import ConsolidationOrder
 from apstra_bp_consolidation.apstra_blueprint import CkEnum
+from apstra_bp_consolidation.apstra_trace import tracer
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
 
 
 def pull_generic_system_off_switch(the_bp, switch_label_pair: list) -> dict:
@@ -66,10 +67,216 @@ def pull_generic_system_off_switch(the_bp, switch_label_pair: list) -> dict:
 
     return generic_systems_data
 
+def build_generic_system_spec(main_bp, generic_system_label: str, gs_data: dict) -> dict:
+    """
+    Build the switch-system-links spec of a generic system
+
+    Args:
+        main_bp: The blueprint to create the generic system in.
+        generic_system_label: The label of the new generic system.
+        gs_data: The link data of the generic system from pull_generic_system_off_switch.
+    """
+    lag_group = {}
+    generic_system_spec = {
+        'links': [],
+        'new_systems': [],
+    }
+
+    # the link data has order dependancy
+    link_list = [ v for k, v in gs_data.items()]
+    for i in range(len(link_list)):
+        link_data = link_list[i]
+        link_spec = {
+            'lag_mode': None,
+            'system': {
+                'system_id': None
+            },
+            'switch': {
+                'system_id': main_bp.get_system_node_from_label(link_data['sw_label'])['id'],
+                'transformation_id': main_bp.get_transformation_id(link_data['sw_label'], link_data['sw_if_name'] , link_data['speed']),
+                'if_name': link_data['sw_if_name'],
+            }                
+        }
+        if 'aggregate_link' in link_data:
+            old_aggregate_link_id = link_data['aggregate_link']
+            if old_aggregate_link_id not in lag_group:
+                lag_group[old_aggregate_link_id] = f"link{len(lag_group)+1}"
+            # link_spec['lag_mode'] = 'lacp_active' # this should not set in 4.1.2
+            # link_spec['group_label'] = lag_group[old_aggregate_link_id] # this should not exist in 4.1.2
+        generic_system_spec['links'].append(link_spec)
+    new_system = {
+        'system_type': 'server',
+        'label': generic_system_label,
+        # 'hostname': None, # hostname should not have '_' in it
+        'port_channel_id_min': 0,
+        'port_channel_id_max': 0,
+        'logical_device': {
+            'display_name': f"auto-{link_data['speed']}x{len(gs_data)}",
+            'id': f"auto-{link_data['speed']}x{len(gs_data)}",
+            'panels': [
+                {
+                    'panel_layout': {
+                        'row_count': 1,
+                        'column_count': len(gs_data),
+                    },
+                    'port_indexing': {
+                        'order': 'T-B, L-R',
+                        'start_index': 1,
+                        'schema': 'absolute'
+                    },
+                    'port_groups': [
+                        {
+                            'count': len(gs_data),
+                            'speed': {
+                                'unit': link_data['speed'][-1:],
+                                'value': int(link_data['speed'][:-1])
+                            },
+                            'roles': [
+                                'leaf',
+                                'access'
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+    generic_system_spec['new_systems'].append(new_system)
+    ethernet_interfaces = [f"{main_bp.get_system_label(x['switch']['system_id'])}:{x['switch']['if_name']}" for x in generic_system_spec['links']]
+    logging.info(f"{generic_system_label} with {ethernet_interfaces} {len(lag_group)} LAG")
+    return generic_system_spec
+
+
+def apply_generic_system_link_attributes(main_bp, created_systems: dict) -> None:
+    """
+    Update the LAG labels and the tags of the created generic system links in bulk
+
+    The LAG labels of all the links go in one leaf-server-link-labels PATCH. The existing tags
+    are read in one query, and the missing tags are added in one /batch with a tagging
+    operation per distinct tag set.
+
+    Args:
+        main_bp: The blueprint of the generic systems.
+        created_systems: { <generic_system_label>: (<link data like new_generic_systems>, [ <link id> ]) }
+            The link ids are in the order of the link data.
+    """
+    """
+    lag_spec example:
+        "links": {
+            "atl1tor-r5r14a<->_atl_rack_1_001_sys072(link-000000001)[1]": {
+                "group_label": "link1",
+                "lag_mode": "lacp_active"
+            },
+            "atl1tor-r5r14b<->_atl_rack_1_001_sys072(link-000000002)[1]": {
+                "group_label": "link1",
+                "lag_mode": "lacp_active"
+            }
+        }            
+    """
+    lag_spec = {
+        'links': {}
+    }
+    link_tags = {}  # { link_id: set(tag) }
+    for generic_system_label, (gs_data, link_ids) in created_systems.items():
+        link_list = [ v for k, v in gs_data.items()]
+        for link_data, link_id in zip(link_list, link_ids):
+            if 'aggregate_link' in link_data and link_data['aggregate_link']:
+                lag_spec['links'][link_id] = {
+                    'group_label': link_data['aggregate_link'],
+                    'lag_mode': 'lacp_active' }
+            if len(link_data['tags']):
+                link_tags[link_id] = set(link_data['tags'])
+
+    if len(lag_spec['links']):
+        lag_updated = main_bp.patch_leaf_server_link_labels(lag_spec)
+        logging.info(f"updated LAG labels of {len(lag_spec['links'])} links")
+        logging.debug("lag_updated: %s", CkLogPayload(lag_updated))
+
+    if len(link_tags) == 0:
+        return
+    # skip the tags already on the links
+    tag_query = f"node(id=is_in({list(link_tags.keys())}), name='link').in_().node('tag', name='tag')"
+    for nodes in main_bp.query(tag_query, use_cache=False):
+        link_tags[nodes['link']['id']].discard(nodes['tag']['label'])
+    # the links with the same tags are tagged together
+    tag_groups = {}  # { (tag): [ link_id ] }
+    for link_id, tags in link_tags.items():
+        if tags:
+            tag_groups.setdefault(tuple(sorted(tags)), []).append(link_id)
+    if len(tag_groups) == 0:
+        return
+    with main_bp.batch_builder(params={'comment': 'tagging'}) as batch:
+        for tags, link_ids in tag_groups.items():
+            batch.add_tagging(link_ids, tags_to_add=list(tags))
+    logging.info(f"tagged {sum(len(x) for x in tag_groups.values())} links with {len(tag_groups)} tag sets in {batch.request_count} batch requests")
+    for failed in batch.failed():
+        logging.error("tagging failed: %s", CkLogPayload(failed))
+
+
+def rename_generic_system_interfaces(main_bp, switch_label_pair: list, generic_system_data: dict) -> int:
+    """
+    Rename the generic system interfaces to gs_if_name in one query and one patch_nodes
+
+    Args:
+        main_bp: The blueprint of the generic systems.
+        switch_label_pair: The switches of the generic systems.
+        generic_system_data: The generic systems to rename the interfaces of, like new_generic_systems.
+
+    Returns:
+        The number of the renamed interfaces
+    """
+    # (sw_label, sw_if_name): gs_if_name
+    wanted_if_names = {
+        (link_data['sw_label'], link_data['sw_if_name']): link_data['gs_if_name']
+        for gs_data in generic_system_data.values() for link_data in gs_data.values() if link_data['gs_if_name']
+    }
+    if len(wanted_if_names) == 0:
+        return 0
+    link_query = f"""
+        node('system', label=is_in({switch_label_pair}), name='switch')
+            .out('hosted_interfaces').node('interface', if_type='ethernet', name='sw_intf')
+            .out('link').node('link', name='link')
+            .in_('link').node('interface', name='gs_intf')
+            .in_('hosted_interfaces').node('system', system_type='server', label=is_in({list(generic_system_data.keys())}), name='server')
+    """
+
+    def all_links_present(link_nodes):
+        found = set((x['switch']['label'], x['sw_intf']['if_name']) for x in link_nodes)
+        return all(x in found for x in wanted_if_names)
+
+    link_nodes = main_bp.wait_for_query(link_query, predicate=all_links_present, multiline=True, timeout=10, description=f"{len(wanted_if_names)} links in {main_bp.label}")
+    if link_nodes is None:
+        # some links are missing. rename the present ones
+        link_nodes = main_bp.query(link_query, multiline=True, use_cache=False)
+
+    patch_spec = []
+    found = set()
+    for nodes in link_nodes:
+        key = (nodes['switch']['label'], nodes['sw_intf']['if_name'])
+        if key not in wanted_if_names:
+            continue
+        found.add(key)
+        if nodes['gs_intf']['if_name'] != wanted_if_names[key]:
+            patch_spec.append({'id': nodes['gs_intf']['id'], 'if_name': wanted_if_names[key]})
+    missing = [f"{x[0]}:{x[1]}" for x in wanted_if_names if x not in found]
+    if missing:
+        logging.warning(f"links not found for the interface rename: {missing}")
+    if patch_spec:
+        renamed = main_bp.patch_nodes(patch_spec)
+        if renamed is not None and renamed.status_code >= 400:
+            logging.error("interface rename failed: status_code=%s, text=%s", renamed.status_code, CkLogPayload(renamed.text))
+            return 0
+    logging.info(f"renamed {len(patch_spec)} generic system interfaces of {len(wanted_if_names)} in {main_bp.label}")
+    return len(patch_spec)
+
+
 # generic system data: generic_system_label.link.dict
-def new_generic_systems(order, generic_system_data:dict) -> dict:
+def new_generic_systems(order, generic_system_data:dict, max_systems_per_request: int = 20) -> dict:
     """
     Create new generic systems in the main blueprint based on the generic systems in the TOR blueprint. 
+    The specs are built locally, the systems are created in a few switch-system-links requests,
+    and the LAG labels, the tags and the interface names are updated at the end in bulk.
+
         <generic_system_label>:
             <link_id>:
                 gs_if_name: None
@@ -79,184 +286,70 @@ def new_generic_systems(order, generic_system_data:dict) -> dict:
                 aggregate_link: <aggregate_link_id>
                 tags: []
 
+    Returns:
+        { 'done': [ label ], 'skipped': [ label ], 'failed': { label: reason } }, or None if the access switches are absent
     """
     # to cache the system id of the systems includin leaf
     main_bp = order.main_bp
     total_generic_system_count = len(generic_system_data)
-    current_generic_system_count = 1
     # warning message for visibility
     logging.warning(f"Creating new generic systems for {main_bp.label=}: {total_generic_system_count=}")
 
     # wait for the access switch to be created
-    for switch_label in order.switch_label_pair:
-        for i in range(5):
-            switch_nodes = main_bp.get_system_node_from_label(switch_label)
-            # it returns None if the system is not created yet
-            if switch_nodes:
-                break
-            logging.info(f"waiting for {switch_label} to be created in {main_bp.label}")
-            time.sleep(3)
+    def access_switches_present():
+        # they can be created by another run. not a write through main_bp
+        main_bp.inventory.refresh()
+        return all(main_bp.get_system_node_from_label(x) for x in order.switch_label_pair)
+    if not main_bp.wait_for(access_switches_present, timeout=15, description=f"{order.switch_label_pair} in {main_bp.label}"):
+        logging.error(f"{order.switch_label_pair} not present in {main_bp.label}. skipping the generic systems")
+        return None
     logging.info(f"{order.switch_label_pair} present in {main_bp.label}")
 
-    # itrerate through the generic systems retrived from the TOR blueprint
-    for generic_system_label, gs_data in generic_system_data.items():
-        # working with a generic system 
-        logging.debug(f"Creating {generic_system_label=} {gs_data=}")
-        # if generic_system_label not in [ 'az1kvm1008-az1kvm1028-atl1-LACP' ]:
-        #     continue
-        # breakpoint()
-        # see if this generic system is already present in the main blueprint
-        if main_bp.get_system_node_from_label(generic_system_label):
-            logging.info(f"skipping: {generic_system_label} is present in the main blueprint")
-            # TODO: compare and revise the generic system
-            continue
-
-        # Create the generic system. This generic system is absent in main blueprint.
-        lag_group = {}
-        generic_system_spec = {
-            'links': [],
-            'new_systems': [],
-        }
+    report = {'done': [], 'skipped': [], 'failed': {}}
+    # build the specs from the inventory and the design catalog. no request per system
+    gs_specs = {}
+    with tracer.span('build_generic_system_specs', systems=total_generic_system_count):
+        for generic_system_label, gs_data in generic_system_data.items():
+            if main_bp.get_system_node_from_label(generic_system_label):
+                # TODO: compare and revise the generic system
+                report['skipped'].append(generic_system_label)
+                continue
+            try:
+                gs_specs[generic_system_label] = build_generic_system_spec(main_bp, generic_system_label, gs_data)
+            except Exception as e:
+                # a bad system does not stop the others
+                logging.exception(f"spec of {generic_system_label} not built")
+                report['failed'][generic_system_label] = f"spec: {e!r}"
 
-        # the link data has order dependancy
-        link_list = [ v for k, v in gs_data.items()]
-        for i in range(len(link_list)):
-        # for _, link_data in generic_system_data.items():
-            link_data = link_list[i]
-            link_spec = {
-                'lag_mode': None,
-                'system': {
-                    'system_id': None
-                },
-                'switch': {
-                    # TODO: this might need to wait for the system to be created
-                    'system_id': main_bp.get_system_node_from_label(link_data['sw_label'])['id'],
-                    'transformation_id': main_bp.get_transformation_id(link_data['sw_label'], link_data['sw_if_name'] , link_data['speed']),
-                    'if_name': link_data['sw_if_name'],
-                }                
-            }
-            if 'aggregate_link' in link_data:
-                old_aggregate_link_id = link_data['aggregate_link']
-                if old_aggregate_link_id not in lag_group:
-                    lag_group[old_aggregate_link_id] = f"link{len(lag_group)+1}"
-                # link_spec['lag_mode'] = 'lacp_active' # this should not set in 4.1.2
-                # link_spec['group_label'] = lag_group[old_aggregate_link_id] # this should not exist in 4.1.2
-            generic_system_spec['links'].append(link_spec)
-            # breakpoint()
-        new_system = {
-            'system_type': 'server',
-            'label': generic_system_label,
-            # 'hostname': None, # hostname should not have '_' in it
-            'port_channel_id_min': 0,
-            'port_channel_id_max': 0,
-            'logical_device': {
-                'display_name': f"auto-{link_data['speed']}x{len(gs_data)}",
-                'id': f"auto-{link_data['speed']}x{len(gs_data)}",
-                'panels': [
-                    {
-                        'panel_layout': {
-                            'row_count': 1,
-                            'column_count': len(gs_data),
-                        },
-                        'port_indexing': {
-                            'order': 'T-B, L-R',
-                            'start_index': 1,
-                            'schema': 'absolute'
-                        },
-                        'port_groups': [
-                            {
-                                'count': len(gs_data),
-                                'speed': {
-                                    'unit': link_data['speed'][-1:],
-                                    'value': int(link_data['speed'][:-1])
-                                },
-                                'roles': [
-                                    'leaf',
-                                    'access'
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        }
-        generic_system_spec['new_systems'].append(new_system)
-        ethernet_interfaces = [f"{main_bp.get_system_label(x['switch']['system_id'])}:{x['switch']['if_name']}" for x in generic_system_spec['links']]
-        # make it warning just to make it visible
-        logging.warning(f"adding {current_generic_system_count}/{total_generic_system_count} {generic_system_label} with {ethernet_interfaces} {len(lag_group)} LAG in the blueprint {main_bp.label}")
-        generic_system_created = main_bp.add_generic_system(generic_system_spec)
-        logging.debug(f"generic_system_created: {generic_system_created}")
-
-        # update the lag mode
-        """
-        lag_spec example:
-            "links": {
-                "atl1tor-r5r14a<->_atl_rack_1_001_sys072(link-000000001)[1]": {
-                    "group_label": "link1",
-                    "lag_mode": "lacp_active"
-                },
-                "atl1tor-r5r14b<->_atl_rack_1_001_sys072(link-000000002)[1]": {
-                    "group_label": "link1",
-                    "lag_mode": "lacp_active"
-                }
-            }            
-        """
-        lag_spec = {
-            'links': {}
-        }
+    with tracer.span('add_generic_systems', systems=len(gs_specs)):
+        created_link_ids = main_bp.add_generic_systems(list(gs_specs.values()), max_systems_per_request=max_systems_per_request)
+    for generic_system_label in gs_specs:
+        if generic_system_label in created_link_ids:
+            report['done'].append(generic_system_label)
+        else:
+            report['failed'][generic_system_label] = 'switch-system-links not created'
 
-        for i in range(len(link_list)):
-        # for _, link_data in generic_system_data.items():
-            link_data = link_list[i]
-            if 'aggregate_link' in link_data and link_data['aggregate_link']:
-                lag_spec['links'][generic_system_created[i]] = {
-                    'group_label': link_data['aggregate_link'],
-                    'lag_mode': 'lacp_active' }
+    # update LAG labels and tags of all the created links at once
+    with tracer.span('apply_generic_system_link_attributes', systems=len(report['done'])):
+        apply_generic_system_link_attributes(main_bp, {x: (generic_system_data[x], created_link_ids[x]) for x in report['done']})
 
-            # tag the link
-            if len(link_data['tags']):
-                tagged = main_bp.post_tagging([generic_system_created[i]], tags_to_add=link_data['tags'])
-                logging.debug(f"{tagged=}")
-
-        if len(lag_spec['links']):
-            lag_updated = main_bp.patch_leaf_server_link_labels(lag_spec)
-            logging.debug(f"lag_updated: {lag_updated}")
-
-        # update generic system interface name
-        for link_data in [v for _, v in gs_data.items() if v['gs_if_name']]:
-            sw_label = link_data['sw_label']
-            sw_if_name = link_data['sw_if_name']
-            gs_if_name = link_data['gs_if_name']
-            link_query = f"""
-                node('system', name='switch', label='{ sw_label }')
-                    .out().node('interface', if_name='{ sw_if_name }', name='sw_intf')
-                    .out().node('link', name='link')
-                    .in_().node('interface', name='gs_intf')
-                    .in_().node('system', system_type='server', name='server')
-            """
-            for i in range(3):
-                link_nodes = main_bp.query(link_query, multiline=True)
-                if len(link_nodes) > 0:
-                    break
-                logging.info(f"waiting for {sw_label}:{sw_if_name} to be created in {main_bp.label}")
-                time.sleep(3)
-                continue
-            if link_nodes is None or len(link_nodes) == 0:
-                logging.warning(f"{link_nodes=} not found. {gs_if_name=}, {link_query=}. Skipping")
-                continue
-            if link_nodes[0]['gs_intf']['if_name'] != gs_if_name:
-                main_bp.patch_node_single(
-                    link_nodes[0]['gs_intf']['id'], 
-                    {"if_name": gs_if_name }
-                )
+    # update generic system interface names of all the created systems at once
+    with tracer.span('rename_generic_system_interfaces', systems=len(report['done'])):
+        rename_generic_system_interfaces(main_bp, order.switch_label_pair, {x: generic_system_data[x] for x in report['done']})
 
-        current_generic_system_count += 1
+    logging.info(f"generic systems of {main_bp.label}: {len(report['done'])} done, {len(report['skipped'])} skipped, "
+                 f"{len(report['failed'])} failed")
+    for generic_system_label, reason in report['failed'].items():
+        logging.error("%s failed: %s", generic_system_label, CkLogPayload(reason))
+    return report
 
 
 @click.command(name='a2-move-generic-systems', help='step 2 - create the generic systems under new access switches')
 def click_move_generic_systems():
     order = ConsolidationOrder()
-    order_move_generic_systems(order)
+    with order.step('a2-move-generic-systems'):
+        order_move_generic_systems(order)
+    order.report_stats()
 
 def order_move_generic_systems(order):
     logging.info(f"======== Moving Generic Systems for {order.switch_label_pair} from {order.tor_bp.label} to {order.main_bp.label}")
@@ -2,8 +2,13 @@
 
 import json
 import logging
+import asyncio
 
 from apstra_bp_consolidation.consolidation import ConsolidationOrder
+from apstra_bp_consolidation.apstra_async import AsyncCkApstraSession
+from apstra_bp_consolidation.apstra_async import AsyncCkApstraBlueprint
+from apstra_bp_consolidation.apstra_trace import tracer
+from apstra_bp_consolidation.apstra_logging import CkLogPayload
 
 # keeping here to use later
 def deep_diff(dict1, dict2, path=""):
@@ -66,10 +71,55 @@ def deep_diff(dict1, dict2, path=""):
 #     logging.debug(f"found {len(vni_list)=}")
 #     return vni_list
 
+async def patch_virtual_networks(the_bp, vn_patch_list: list, concurrency: int = 4) -> int:
+    """
+    Patch the virtual networks concurrently. A failed virtual network does not stop the others.
+
+    Args:
+        the_bp: The blueprint object.
+        vn_patch_list: The list of (vni, patch spec)
+        concurrency: The maximum number of patches in flight
+
+    Returns:
+        The number of the virtual networks failed to patch
+    """
+    async_bp = AsyncCkApstraBlueprint(AsyncCkApstraSession(the_bp.session, concurrency), the_bp)
+    total_patch = len(vn_patch_list)
+
+    async def patch_one(vni, vn_spec):
+        with tracer.span(f"vni {vni}", 'object', async_id=f"vni:{vni}") as span_args:
+            try:
+                response = await async_bp.patch_virtual_network(vn_spec)
+            except Exception as e:
+                span_args['error'] = repr(e)
+                return vni, None, e
+            span_args['status_code'] = response.status_code
+            return vni, response, None
+
+    patch_count = 0
+    failed_count = 0
+    for patched in asyncio.as_completed([patch_one(vni, vn_spec) for vni, vn_spec in vn_patch_list]):
+        vni, response, error = await patched
+        patch_count += 1
+        if error is not None:
+            failed_count += 1
+            logging.error("%s/%s vni=%s patch failed: %r", patch_count, total_patch, vni, error)
+        elif response.status_code >= 400:
+            failed_count += 1
+            logging.error("%s/%s vni=%s patch failed: status_code=%s, text=%s", patch_count, total_patch, vni, response.status_code, CkLogPayload(response.text))
+        else:
+            logging.info("patched %s/%s vni=%s", patch_count, total_patch, vni)
+    if failed_count:
+        logging.error(f"{failed_count} of {total_patch} virtual networks failed to patch")
+    return failed_count
+
+
 # def access_switch_assign_vns(the_bp, vni_list: list, switch_label_pair: list):
-def access_switch_assign_vns(order):
+def access_switch_assign_vns(order, concurrency: int = 4):
     """
     Assign VN to the access switch pair
+        All the virtual networks are pulled at once and the bound_to changes are computed in memory.
+        The changed virtual networks are patched concurrently.
     """
     switch_label_pair = order.switch_label_pair
     the_bp = order.main_bp
@@ -94,6 +144,9 @@ def access_switch_assign_vns(order):
     total_skipped = 0
     total_leaf_missing = 0
 
+    # the staged virtual networks by vni
+    vn_table = the_bp.get_virtual_networks()
+    vn_patch_list = []  # [ (vni, patch spec) ]
 
     # iterate vni list
     for vni_index in range(total_vni):
@@ -102,8 +155,7 @@ def access_switch_assign_vns(order):
         modified = False
         leaf_found = False
         # get the vn spec from the staged data
-        existing_vn_spec = the_bp.get_virtual_network(vni)
-        logging.debug(f"{vni=} {existing_vn_spec=}")
+        existing_vn_spec = vn_table.get(str(vni))
         # return
         if existing_vn_spec is None:
             logging.warning(f"{vni=} absent -- skipping")
@@ -134,18 +186,22 @@ def access_switch_assign_vns(order):
             continue
 
         # endpoint would fail due to missing label
-        del existing_vn_spec['endpoints']
-        vn_patched = the_bp.patch_virtual_network(existing_vn_spec)
-        logging.info(f"{vni_count}/{total_vni} {vni=}, {vn_patched=}")
-    
-    logging.info(f"{switch_label_pair=} {total_vni=}, {total_updated=}, {total_skipped=}, {total_leaf_missing=}")
+        existing_vn_spec.pop('endpoints', None)
+        vn_patch_list.append((vni, existing_vn_spec))
+
+    logging.info(f"patching {len(vn_patch_list)} virtual networks with {concurrency=}")
+    total_failed = asyncio.run(patch_virtual_networks(the_bp, vn_patch_list, concurrency))
+
+    logging.info(f"{switch_label_pair=} {total_vni=}, {total_updated=}, {total_skipped=}, {total_leaf_missing=}, {total_failed=}")
 
 
 import click
 @click.command(name='a3-move-virtual-networks', help='step 3 - assign virtual networks to new access switch pair')
 def click_move_virtual_networks():
     order = ConsolidationOrder()
-    order_move_virtual_networks(order)
+    with order.step('a3-move-virtual-networks'):
+        order_move_virtual_networks(order)
+    order.report_stats()
 
 def order_move_virtual_networks(order):
     logging.info(f"======== Moving Virtual Networks for {order.switch_label_pair} from {order.tor_bp.label} to {order.main_bp.label}")
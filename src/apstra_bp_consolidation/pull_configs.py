@@ -29,7 +29,9 @@ def order_pull_configurations(order: ConsolidationOrder):
 @click.command(name='a5-pull-configurations', help='step 5 - pull produced configurations to compare')
 def click_pull_configurations():
     order = ConsolidationOrder()
-    order_pull_configurations(order)
+    with order.step('a5-pull-configurations'):
+        order_pull_configurations(order)
+    order.report_stats()
 
 if __name__ == '__main__':
     click_pull_configurations()
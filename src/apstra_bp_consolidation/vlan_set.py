@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+
+# set of VLAN ids
+class CkVlanSet:
+    """
+    A set of VLAN ids (0-4095) kept as a 4096-bit integer bitmap.
+
+    The union, intersection and difference are single integer operations, and the equal
+    sets compare equal. It is mutable like set, and not hashable. It iterates in the ascending order.
+
+    Example:
+        tor_vlans = CkVlanSet([10, 11, 12, 20])
+        main_vlans = CkVlanSet.from_range_string('10-12')
+        (tor_vlans - main_vlans).to_range_string()  # '20'
+    """
+    MAX_VLAN_ID = 4095
+
+    def __init__(self, vlans=None) -> None:
+        """
+        Initialize a CkVlanSet object.
+
+        Args:
+            vlans: The iterable of VLAN ids, or another CkVlanSet.
+        """
+        self.bits = 0
+        if isinstance(vlans, CkVlanSet):
+            self.bits = vlans.bits
+        elif vlans is not None:
+            for vlan_id in vlans:
+                self.add(vlan_id)
+
+    @classmethod
+    def _from_bits(cls, bits: int):
+        vlan_set = cls()
+        vlan_set.bits = bits
+        return vlan_set
+
+    @classmethod
+    def from_range_string(cls, range_string: str):
+        """
+        Build from the range string like '10-12,20'
+        """
+        vlan_set = cls()
+        for part in (range_string or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition('-')
+            for vlan_id in range(int(first), int(last or first) + 1):
+                vlan_set.add(vlan_id)
+        return vlan_set
+
+    def add(self, vlan_id: int) -> None:
+        vlan_id = int(vlan_id)
+        if not 0 <= vlan_id <= self.MAX_VLAN_ID:
+            raise ValueError(f"{vlan_id=} out of range")
+        self.bits |= 1 << vlan_id
+
+    def discard(self, vlan_id: int) -> None:
+        self.bits &= ~(1 << int(vlan_id))
+
+    def __contains__(self, vlan_id) -> bool:
+        return 0 <= int(vlan_id) <= self.MAX_VLAN_ID and bool(self.bits >> int(vlan_id) & 1)
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def __len__(self) -> int:
+        return bin(self.bits).count('1')
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __or__(self, other):
+        return self._from_bits(self.bits | CkVlanSet(other).bits)
+
+    def __and__(self, other):
+        return self._from_bits(self.bits & CkVlanSet(other).bits)
+
+    def __sub__(self, other):
+        return self._from_bits(self.bits & ~CkVlanSet(other).bits)
+
+    def __xor__(self, other):
+        return self._from_bits(self.bits ^ CkVlanSet(other).bits)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CkVlanSet):
+            return self.bits == other.bits
+        if isinstance(other, (set, frozenset, list, tuple)):
+            return self.bits == CkVlanSet(other).bits
+        return NotImplemented
+
+    # mutable. a changed set would be lost in a dict or a set
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CkVlanSet('{self.to_range_string()}')"
+
+    def to_list(self) -> list:
+        """
+        Return the VLAN ids in the ascending order
+        """
+        return list(self)
+
+    def to_range_string(self) -> str:
+        """
+        Return the range string like '10-12,20'
+        """
+        ranges = []
+        for vlan_id in self:
+            if ranges and ranges[-1][1] == vlan_id - 1:
+                ranges[-1][1] = vlan_id
+            else:
+                ranges.append([vlan_id, vlan_id])
+        return ','.join(f"{first}" if first == last else f"{first}-{last}" for first, last in ranges)
@@ -1,6 +1,10 @@
+import json
+from urllib.parse import urlsplit
+
 import pytest
 
 from apstra_bp_consolidation.apstra_session import CkApstraSession
+from apstra_bp_consolidation.apstra_blueprint import CkApstraBlueprint
 
 class Data:
     apstra_host: str = '10.85.192.61'  # 4.1.2
@@ -34,3 +38,73 @@ def tor_bp():
 
 
 
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = '' if data is None else json.dumps(data)
+        self.content = self.text.encode()
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """
+    The controller double for the blueprint. It records the requests, and answers them with
+    the handlers of route(). A handler takes the json body and returns the json data of the
+    response, or (status_code, json data). The requests without route get 404.
+    """
+    url_prefix = 'https://apstra/api'
+
+    def __init__(self):
+        self.routes = []  # [ (method, path suffix, handler) ]
+        self.requests = []  # [ (method, path, json body) ]
+
+    def route(self, method: str, path_suffix: str, handler):
+        self.routes.insert(0, (method, path_suffix, handler))
+
+    def request(self, method, url, json=None, params=None, **kwargs):
+        path = urlsplit(url).path
+        self.requests.append((method, path, json))
+        for route_method, path_suffix, handler in self.routes:
+            if route_method == method and path.endswith(path_suffix):
+                result = handler(json)
+                if isinstance(result, tuple):
+                    return FakeResponse(*result)
+                return FakeResponse(200, result)
+        return FakeResponse(404, {'errors': f"no route of {method} {path}"})
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def bodies(self, method: str, path_suffix: str) -> list:
+        """
+        Return the json bodies of the requests to the path
+        """
+        return [body for x, path, body in self.requests if x == method and path.endswith(path_suffix)]
+
+    def get_blueprint_summary(self, id=None, label=None):
+        return {'id': 'bp-1', 'label': label}
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession()
+
+
+@pytest.fixture
+def fake_bp(fake_session):
+    """
+    The blueprint 'main' on the fake controller. The /batch requests succeed by default.
+    """
+    fake_session.route('POST', '/batch', lambda body: (201, None))
+    return CkApstraBlueprint(fake_session, 'main')
@@ -0,0 +1,26 @@
+from apstra_bp_consolidation.apstra_rate_limiter import CkRateLimiter
+
+
+def test_20_retry_after_seconds():
+    assert CkRateLimiter.parse_retry_after('3') == 3.0
+    assert CkRateLimiter.parse_retry_after(None) is None
+    assert CkRateLimiter.parse_retry_after('not-a-date') is None
+
+
+def test_21_throttled_cuts_rate():
+    limiter = CkRateLimiter(rate=8.0, min_rate=1.0, decrease_factor=0.5, backoff_base=0.01)
+    delay = limiter.on_throttled('2', 0)
+    assert 2.0 <= delay <= 2.01
+    assert limiter.rate == 4.0
+    assert limiter.learned_rate == 8.0
+    assert limiter.stats()['throttled_count'] == 1
+    limiter.on_throttled(None, 10)
+    limiter.on_throttled(None, 10)
+    assert limiter.rate == 1.0
+
+
+def test_22_success_grows_rate():
+    limiter = CkRateLimiter(rate=1.0, max_rate=1.5, increase_step=0.2)
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 1.5
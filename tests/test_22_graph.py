@@ -0,0 +1,109 @@
+import pytest
+
+from apstra_bp_consolidation.apstra_graph import CkApstraGraph, CkGraphUnsupported
+
+
+def build_graph():
+    nodes = [
+        {'id': 'sw1', 'type': 'system', 'label': 'tor-a', 'system_type': 'switch'},
+        {'id': 'sw2', 'type': 'system', 'label': 'tor-b', 'system_type': 'switch'},
+        {'id': 'gs1', 'type': 'system', 'label': 'server-1', 'system_type': 'server'},
+        {'id': 'sw1-if', 'type': 'interface', 'if_name': 'xe-0/0/1', 'if_type': 'ethernet'},
+        {'id': 'sw2-if', 'type': 'interface', 'if_name': 'xe-0/0/1', 'if_type': 'ethernet'},
+        {'id': 'gs1-if1', 'type': 'interface', 'if_name': 'eth0', 'if_type': 'ethernet'},
+        {'id': 'gs1-if2', 'type': 'interface', 'if_name': 'eth1', 'if_type': 'ethernet'},
+        {'id': 'link1', 'type': 'link', 'label': 'link1'},
+        {'id': 'link2', 'type': 'link', 'label': 'link2'},
+        {'id': 'tag1', 'type': 'tag', 'label': 'blue'},
+        {'id': 'vn1', 'type': 'virtual_network', 'vn_id': '100010'},
+    ]
+    relationships = [
+        ('sw1', 'hosted_interfaces', 'sw1-if'),
+        ('sw2', 'hosted_interfaces', 'sw2-if'),
+        ('gs1', 'hosted_interfaces', 'gs1-if1'),
+        ('gs1', 'hosted_interfaces', 'gs1-if2'),
+        ('sw1-if', 'link', 'link1'),
+        ('gs1-if1', 'link', 'link1'),
+        ('sw2-if', 'link', 'link2'),
+        ('gs1-if2', 'link', 'link2'),
+        ('tag1', 'tag', 'link1'),
+    ]
+    return CkApstraGraph({
+        'version': 3,
+        'nodes': {x['id']: x for x in nodes},
+        'relationships': {f"r{i}": {'id': f"r{i}", 'source_id': s, 'type': t, 'target_id': d} for i, (s, t, d) in enumerate(relationships)},
+    })
+
+
+def test_22_node_attribute():
+    graph = build_graph()
+    assert [x['vn']['id'] for x in graph.query("node('virtual_network', vn_id='100010', name='vn')")] == ['vn1']
+    assert len(graph.query("node('system', label=is_in(['tor-a', 'tor-b']), name='system')")) == 2
+
+
+def test_23_path_in_and_out():
+    graph = build_graph()
+    rows = graph.query("""
+        node('system', label='tor-a', name='switch')
+            .out('hosted_interfaces').node('interface', name='sw_intf')
+            .out('link').node('link', name='link')
+            .in_('link').node('interface', name='gs_intf')
+            .in_('hosted_interfaces').node('system', system_type='server', name='server')
+    """)
+    assert len(rows) == 1
+    assert rows[0]['gs_intf']['if_name'] == 'eth0'
+    assert rows[0]['server']['label'] == 'server-1'
+
+
+def test_24_match_optional_distinct():
+    graph = build_graph()
+    rows = graph.query("""
+        match(
+            node('system', system_type='server', name='gs')
+                .out('hosted_interfaces').node('interface', name='gs_intf')
+                .out('link').node('link', name='link')
+                .in_('link').node('interface', name='sw_intf')
+                .in_('hosted_interfaces').node('system', system_type='switch', name='switch'),
+            optional(
+                node('tag', name='tag').out().node(name='link')
+            )
+        )
+    """)
+    tags = {x['switch']['label']: x['tag'] and x['tag']['label'] for x in rows}
+    assert tags == {'tor-a': 'blue', 'tor-b': None}
+    distinct_rows = graph.query("""
+        match(
+            node('system', system_type='server', name='gs')
+                .out('hosted_interfaces').node('interface')
+                .out('link').node('link', name='link')
+        ).distinct(['gs'])
+    """)
+    assert len(distinct_rows) == 1
+
+
+def test_25_only_query_calls_evaluated():
+    graph = build_graph()
+    for query_string in [
+        "().__class__.__base__.__subclasses__()",
+        "node('system').__class__",
+        "__import__('os').system('true')",
+        "node('system', label=[x for x in 'ab'])",
+        "node('system').where(lambda x: x)",
+    ]:
+        with pytest.raises(CkGraphUnsupported):
+            graph.query(query_string)
+
+
+def test_26_is_in_ids():
+    graph = build_graph()
+    rows = graph.query("node(id=is_in(['link2', 'missing', 'link1']), name='link').in_('tag').node('tag', name='tag')")
+    assert [x['link']['id'] for x in rows] == ['link1']
+    assert len(graph.query("node('virtual_network', vn_id=is_in([100010]), name='vn')")) == 1
+
+
+def test_27_rows_copied():
+    graph = build_graph()
+    rows = graph.query("node('system', label='tor-a', name='system')")
+    rows[0]['system']['label'] = 'edited'
+    assert graph.nodes_by_id['sw1']['label'] == 'tor-a'
+    assert [x['system']['label'] for x in graph.query("node('system', label='tor-a', name='system')")] == ['tor-a']
@@ -0,0 +1,43 @@
+from apstra_bp_consolidation.apstra_batch import CkBatchBuilder
+
+
+def test_24_policy_apply_packed(fake_bp, fake_session):
+    with CkBatchBuilder(fake_bp) as batch:
+        for i in range(10):
+            batch.add_policy_apply(f"intf-{i}", ['ct-1', 'ct-2'])
+        batch.add_delete_links(['link-1'])
+        batch.add_policy_apply('intf-x', ['ct-3'], used=False)
+    assert len(fake_session.bodies('POST', '/batch')) == 1
+    operations = fake_session.bodies('POST', '/batch')[0]['operations']
+    assert [x['path'] for x in operations] == ['/obj-policy-batch-apply', '/delete-switch-system-links', '/obj-policy-batch-apply']
+    assert len(operations[0]['payload']['application_points']) == 10
+    assert operations[2]['payload']['application_points'][0]['policies'] == [{'policy': 'ct-3', 'used': False}]
+    assert batch.failed() == []
+
+
+def test_25_flush_on_limits(fake_bp, fake_session):
+    with CkBatchBuilder(fake_bp, max_operations=2, max_policies_per_operation=3) as batch:
+        batch.add_policy_apply('intf-1', [f"ct-{i}" for i in range(7)])
+    # 7 policies -> 3 operations of 3, 3, 1 -> 2 requests of 2 and 1 operations
+    assert [len(x['operations']) for x in fake_session.bodies('POST', '/batch')] == [2, 1]
+    assert batch.request_count == 2
+
+
+def test_26_flush_on_size(fake_bp, fake_session):
+    with CkBatchBuilder(fake_bp, max_payload_bytes=400) as batch:
+        for i in range(10):
+            batch.add_policy_apply(f"intf-{i}", ['ct-1'])
+    assert len(fake_session.bodies('POST', '/batch')) > 1
+    assert sum(len(x['operations'][0]['payload']['application_points']) for x in fake_session.bodies('POST', '/batch')) == 10
+
+
+def test_27_policy_changes(fake_bp, fake_session):
+    with CkBatchBuilder(fake_bp) as batch:
+        batch.add_policy_changes('intf-1', attach=['ct-1'], detach=['ct-2'])
+        batch.add_policy_apply('intf-2', ['ct-1'])
+    operations = fake_session.bodies('POST', '/batch')[0]['operations']
+    assert len(operations) == 1
+    assert operations[0]['payload']['application_points'] == [
+        {'id': 'intf-1', 'policies': [{'policy': 'ct-1', 'used': True}, {'policy': 'ct-2', 'used': False}]},
+        {'id': 'intf-2', 'policies': [{'policy': 'ct-1', 'used': True}]},
+    ]
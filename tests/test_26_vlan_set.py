@@ -0,0 +1,28 @@
+import pytest
+
+from apstra_bp_consolidation.vlan_set import CkVlanSet
+
+
+def test_26_set_algebra():
+    tor_vlans = CkVlanSet([20, 10, 11, 12, 11])
+    main_vlans = CkVlanSet.from_range_string('10-12, 30')
+    assert tor_vlans.to_list() == [10, 11, 12, 20]
+    assert len(tor_vlans) == 4
+    assert 20 in tor_vlans and 30 not in tor_vlans
+    assert (tor_vlans | main_vlans).to_list() == [10, 11, 12, 20, 30]
+    assert (tor_vlans & main_vlans) == {10, 11, 12}
+    assert (tor_vlans - main_vlans).to_list() == [20]
+    assert (tor_vlans ^ main_vlans).to_range_string() == '20,30'
+    assert tor_vlans == CkVlanSet.from_range_string(tor_vlans.to_range_string())
+    assert not CkVlanSet()
+
+
+def test_27_range():
+    assert CkVlanSet([0, 4095]).to_range_string() == '0,4095'
+    with pytest.raises(ValueError):
+        CkVlanSet([4096])
+
+
+def test_28_not_hashable():
+    with pytest.raises(TypeError):
+        {CkVlanSet([10]): 'vlan 10'}
@@ -0,0 +1,26 @@
+from apstra_bp_consolidation.apstra_stats import CkRequestStats
+
+
+def test_30_endpoint_template():
+    url = 'https://host:443/api/blueprints/0a1b2c3d-0000-1111-2222-333344445555/nodes/sw1<->gs1(link-1)[1]?async=full'
+    assert CkRequestStats.endpoint_template(url) == '/api/blueprints/{id}/nodes/{id}'
+    assert CkRequestStats.endpoint_template('https://host/api/blueprints/bp-1/qe') == '/api/blueprints/{id}/qe'
+
+
+def test_31_step_summary():
+    stats = CkRequestStats()
+    stats.record('GET', 'https://host/api/version', 200, 0.01)
+    with stats.step('a1'):
+        for i in range(1, 21):
+            stats.record('POST', f"https://host/api/blueprints/bp-{i}/qe", 200, i / 100, request_bytes=10, response_bytes=100)
+        stats.record('PATCH', 'https://host/api/blueprints/bp-1/nodes', 429, 1.0, throttled=3)
+    summary = stats.summary()
+    assert list(summary) == ['-', 'a1']
+    qe = summary['a1']['endpoints']['POST /api/blueprints/{id}/qe']
+    assert qe['count'] == 20
+    assert qe['p50_ms'] == 100.0
+    assert qe['p95_ms'] == 190.0
+    assert qe['request_bytes'] == 200
+    assert summary['a1']['total']['errors'] == 1
+    assert summary['a1']['total']['throttled'] == 3
+    assert stats.current_step == '-'
@@ -0,0 +1,26 @@
+import json
+
+from apstra_bp_consolidation.apstra_trace import CkTracer
+
+
+def test_32_trace_events(tmp_path):
+    tracer = CkTracer()
+    with tracer.span('ignored'):
+        pass
+    assert tracer.events == []
+
+    tracer.enable()
+    with tracer.span('step-1', 'step'):
+        with tracer.span('GET /api/version', 'http') as span_args:
+            span_args['status_code'] = 200
+        with tracer.span('gs-1', 'object', async_id='gs-1'):
+            pass
+    trace_file = tmp_path / 'trace.json'
+    tracer.write(str(trace_file))
+
+    events = json.loads(trace_file.read_text())['traceEvents']
+    assert [x['ph'] for x in events] == ['M', 'X', 'b', 'e', 'X']
+    http_event, step_event = events[1], events[4]
+    assert http_event['args'] == {'status_code': 200}
+    assert step_event['ts'] <= http_event['ts'] and http_event['ts'] + http_event['dur'] <= step_event['ts'] + step_event['dur']
+    assert events[2]['id'] == events[3]['id'] == 'gs-1'
@@ -0,0 +1,60 @@
+import logging
+import logging.handlers
+import queue
+import threading
+
+from apstra_bp_consolidation.apstra_logging import CustomFormatter, CkLogPayload, CkQueueHandler
+
+
+class RenderingPayload(CkLogPayload):
+    # records the threads rendering it
+    def __init__(self, data) -> None:
+        super().__init__(data)
+        self.rendered_in = []
+
+    def __str__(self) -> str:
+        self.rendered_in.append(threading.current_thread().name)
+        return super().__str__()
+
+
+def test_34_formatter_cached():
+    formatter = CustomFormatter()
+    cached = dict(formatter.formatters)
+    record = logging.LogRecord('test', logging.WARNING, __file__, 1, 'hello %s', ('world',), None)
+    assert 'hello world' in formatter.format(record)
+    assert formatter.formatters == cached
+
+
+def test_35_payload_truncated():
+    assert str(CkLogPayload({'a': 1})) == '{"a": 1}'
+    assert str(CkLogPayload(b'abc')) == 'abc'
+    truncated = str(CkLogPayload('x' * 100, max_chars=10))
+    assert truncated == 'xxxxxxxxxx...(100 chars)'
+
+
+def test_36_payload_not_rendered_below_level():
+    logger = logging.getLogger('test_36')
+    logger.setLevel(logging.INFO)
+    payload = RenderingPayload({'a': 1})
+    logger.debug('%s', payload)
+    assert payload.rendered_in == []
+
+
+def test_37_queue_listener_renders_payload():
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    logger = logging.getLogger('test_37')
+    logger.propagate = False
+    queue_handler = CkQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    payload = RenderingPayload({'a': 1})
+    try:
+        logger.error('spec %s', payload)
+        assert payload.rendered_in == []
+        listener.start()
+    finally:
+        listener.stop()
+        logger.removeHandler(queue_handler)
+    assert len(payload.rendered_in) == 1
+    assert payload.rendered_in[0] != threading.current_thread().name
@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+def route_systems(fake_session):
+    def qe(body):
+        time.sleep(0.05)
+        return {'items': [{'system': {'id': 'leaf-1', 'label': 'leaf1'}, 'im': {'id': 'im-1'}}]}
+    fake_session.route('POST', '/qe', qe)
+
+
+def test_36_concurrent_lookups_one_query(fake_bp, fake_session):
+    route_systems(fake_session)
+    threads = [threading.Thread(target=fake_bp.inventory.get, args=('leaf1',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fake_session.bodies('POST', '/qe')) == 1
+
+
+def test_37_add_without_refresh(fake_bp, fake_session):
+    route_systems(fake_session)
+    inventory = fake_bp.inventory
+    assert inventory.get_system('gs1') is None
+    inventory.add({'id': 'gs-1', 'label': 'gs1'})
+    assert inventory.get_system('gs1')['id'] == 'gs-1'
+    assert inventory.get_label('gs-1') == 'gs1'
+    assert inventory.get_system('leaf1')['id'] == 'leaf-1'
+    assert len(fake_session.bodies('POST', '/qe')) == 1
+
+
+def test_38_lookup_by_label_and_id(fake_bp, fake_session):
+    route_systems(fake_session)
+    assert fake_bp.inventory.get('leaf1') == {'system': {'id': 'leaf-1', 'label': 'leaf1'}, 'im': {'id': 'im-1'}}
+    assert fake_bp.get_system_node_from_label('leaf1')['id'] == 'leaf-1'
+    assert fake_bp.get_system_label('leaf-1') == 'leaf1'
+    assert fake_bp.inventory.get_by_id('missing') is None
+    assert len(fake_session.bodies('POST', '/qe')) == 1
+
+
+def test_39_invalidated_by_write(fake_bp, fake_session):
+    route_systems(fake_session)
+    fake_session.route('PATCH', '/nodes', lambda body: {})
+    fake_bp.get_system_node_from_label('leaf1')
+    fake_bp.patch_nodes([{'id': 'leaf-1', 'label': 'leaf1'}])
+    fake_bp.get_system_node_from_label('leaf1')
+    assert len(fake_session.bodies('POST', '/qe')) == 2
@@ -0,0 +1,66 @@
+from apstra_bp_consolidation.apstra_blueprint import CkApstraBlueprint
+
+
+def route_controller(fake_session, bad_labels):
+    """
+    A switch-system-links request fails as a whole if any of its systems is bad
+    """
+    created = []
+
+    def switch_system_links(body):
+        labels = [x['label'] for x in body['new_systems']]
+        if set(labels) & bad_labels:
+            return (422, {'errors': 'bad system'})
+        created.extend(labels)
+        return {'ids': []}
+
+    def qe(body):
+        if "name='im'" in body['query']:
+            return {'items': []}  # the inventory
+        return {'items': [
+            {'server': {'id': f"id-{x}", 'label': x}, 'switch': {'id': 'leaf-1'},
+             'sw_intf': {'if_name': f"xe-0/0/{x[2:]}"}, 'link': {'id': f"link-{x}"}}
+            for x in created
+        ]}
+    fake_session.route('POST', '/switch-system-links', switch_system_links)
+    fake_session.route('POST', '/qe', qe)
+
+
+def gs_spec(label, index):
+    return {
+        'new_systems': [{'label': label}],
+        'links': [{'system': {'system_id': None}, 'switch': {'system_id': 'leaf-1', 'if_name': f"xe-0/0/{index}"}}],
+    }
+
+
+def test_38_merged_requests(fake_bp, fake_session):
+    route_controller(fake_session, set())
+    created = fake_bp.add_generic_systems([gs_spec(f"gs{i}", i) for i in range(5)], max_systems_per_request=3)
+    assert sorted(created) == ['gs0', 'gs1', 'gs2', 'gs3', 'gs4']
+    bodies = fake_session.bodies('POST', '/switch-system-links')
+    assert [len(x['new_systems']) for x in bodies] == [3, 2]
+    assert [x['system']['new_system_index'] for x in bodies[0]['links']] == [0, 1, 2]
+
+
+def test_39_bad_system_isolated(fake_bp, fake_session):
+    route_controller(fake_session, {'gs2'})
+    created = fake_bp.add_generic_systems([gs_spec(f"gs{i}", i) for i in range(4)], max_systems_per_request=4)
+    assert created == {'gs0': ['link-gs0'], 'gs1': ['link-gs1'], 'gs3': ['link-gs3']}
+    # one failed request of 4, then one by one
+    assert [len(x['new_systems']) for x in fake_session.bodies('POST', '/switch-system-links')] == [4, 1, 1, 1, 1]
+    # the created systems are in the inventory without a refresh
+    assert fake_bp.inventory.get_system('gs0')['id'] == 'id-gs0'
+
+
+def test_40_merge_switch_system_links():
+    merged = CkApstraBlueprint.merge_switch_system_links([
+        {'new_systems': [{'label': 'a'}], 'links': [{'system': {'system_id': None}}, {'system': {'system_id': None}}]},
+        {'new_systems': [{'label': 'b'}], 'links': [{'system': {'system_id': 'existing'}}, {'system': {'system_id': None}}]},
+    ])
+    assert [x['label'] for x in merged['new_systems']] == ['a', 'b']
+    assert [x['system'] for x in merged['links']] == [
+        {'system_id': None, 'new_system_index': 0},
+        {'system_id': None, 'new_system_index': 0},
+        {'system_id': 'existing'},
+        {'system_id': None, 'new_system_index': 1},
+    ]
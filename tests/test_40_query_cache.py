@@ -0,0 +1,84 @@
+import asyncio
+
+from apstra_bp_consolidation.apstra_async import AsyncCkApstraSession, AsyncCkApstraBlueprint
+from apstra_bp_consolidation.apstra_query_cache import CkQueryCache
+
+
+def route_systems(fake_session, during_query=None):
+    """
+    Answer qe with a system labeled by the number of the qe requests
+    """
+    def qe(body):
+        if during_query:
+            during_query()
+        qe_count = len(fake_session.bodies('POST', '/qe'))
+        return {'items': [{'system': {'id': 'sw1', 'label': f"tor-{qe_count}"}}]}
+    fake_session.route('POST', '/qe', qe)
+
+
+def test_40_normalize():
+    assert CkQueryCache.normalize("""
+        node('system', label='tor a',  name='system')
+            .out( 'hosted_interfaces' ).node(name="if  1")
+    """) == "node('system',label='tor a',name='system').out('hosted_interfaces').node(name=\"if  1\")"
+    assert CkQueryCache.normalize("node(label=is_in([ 'a', 'b' ]))") == CkQueryCache.normalize("node(label=is_in(['a','b']))")
+
+
+def test_41_rows_copied(fake_bp, fake_session):
+    route_systems(fake_session)
+    rows = fake_bp.query("node('system', name='system')")
+    rows[0]['system']['label'] = 'changed'
+    rows.append({})
+    assert fake_bp.query("node('system',  name='system')") == [{'system': {'id': 'sw1', 'label': 'tor-1'}}]
+    assert len(fake_session.bodies('POST', '/qe')) == 1
+
+
+def test_42_invalidated_by_write(fake_bp, fake_session):
+    route_systems(fake_session)
+    fake_bp.query("node('system', name='system')")
+    fake_bp._on_write()
+    assert fake_bp.query("node('system', name='system')")[0]['system']['label'] == 'tor-2'
+    # a write while the query is in flight. the result may predate the write
+    fake_bp._on_write()
+    route_systems(fake_session, during_query=fake_bp._on_write)
+    fake_bp.query("node('system', name='system')")
+    route_systems(fake_session)
+    assert fake_bp.query("node('system', name='system')")[0]['system']['label'] == 'tor-4'
+    assert len(fake_session.bodies('POST', '/qe')) == 4
+
+
+def test_43_async_query_use_cache(fake_bp, fake_session):
+    route_systems(fake_session)
+    async_bp = AsyncCkApstraBlueprint(AsyncCkApstraSession(fake_session), fake_bp)
+
+    async def query_twice(use_cache):
+        await async_bp.query("node('system', name='system')", use_cache=use_cache)
+        return await async_bp.query("node('system', name='system')", use_cache=use_cache)
+    asyncio.run(query_twice(True))
+    assert len(fake_session.bodies('POST', '/qe')) == 1
+    assert asyncio.run(query_twice(False))[0]['system']['label'] == 'tor-3'
+
+
+def test_44_no_version_probe(fake_bp, fake_session):
+    route_systems(fake_session)
+    # the staging version would be stale at every query
+    fake_bp.version_ttl = 0
+    for _ in range(5):
+        fake_bp.query("node('system', name='system')")
+    uncached_count = len(fake_session.requests)
+    for _ in range(5):
+        fake_bp.query("node('system', name='system')", use_cache=False)
+    # 1 qe for the 5 cached queries, no diff-status. 1 qe each without the cache
+    assert uncached_count == 1
+    assert len(fake_session.requests) - uncached_count == 5
+
+
+def test_45_check_version(fake_bp, fake_session):
+    route_systems(fake_session)
+    versions = iter([3, 3, 4])
+    fake_session.route('GET', '/diff-status', lambda body: {'staging_version': next(versions)})
+    assert fake_bp.query("node('system', name='system')", check_version=True)[0]['system']['label'] == 'tor-1'
+    assert fake_bp.query("node('system', name='system')", check_version=True)[0]['system']['label'] == 'tor-1'
+    # changed outside the client
+    assert fake_bp.query("node('system', name='system')", check_version=True)[0]['system']['label'] == 'tor-2'
+    assert len(fake_session.bodies('GET', '/diff-status')) == 3
@@ -0,0 +1,122 @@
+import copy
+
+import pytest
+
+# the move modules are loaded through consolidation, which imports them back
+import apstra_bp_consolidation.consolidation  # noqa: F401
+from apstra_bp_consolidation.apstra_blueprint import CkEnum
+from apstra_bp_consolidation.move_ct import diff_interface_cts, fold_interface_vlan_facts, pull_interface_ownership, update_interface_id
+from apstra_bp_consolidation.vlan_set import CkVlanSet
+
+
+def fact(interface_id, vlan_id, is_tagged):
+    return {
+        'interface': {'id': interface_id},
+        'AttachSingleVLAN': {'attributes': {'vlan_tagged' if is_tagged else 'untagged': {}}},
+        'virtual_network': {'vn_id': str(100000 + vlan_id)},
+    }
+
+
+HOSTED = {'if-1': ('tor-a', 'xe-0/0/1'), 'if-2': ('tor-a', 'xe-0/0/2')}
+EVPN = {'ae-1': {'tor-a': {'xe-0/0/3'}, 'tor-b': {'xe-0/0/3'}}}
+
+
+@pytest.mark.parametrize('rows, expected', [
+    # tagged
+    ([fact('if-1', 10, True), fact('if-1', 12, True), fact('if-1', 11, True)],
+     {'if-1': ([10, 11, 12], None)}),
+    # untagged with tagged
+    ([fact('if-1', 10, True), fact('if-1', 20, False)],
+     {'if-1': ([10], 20)}),
+    # untagged only
+    ([fact('if-2', 30, False)],
+     {'if-2': ([], 30)}),
+    # LAG on the EVPN interface
+    ([fact('ae-1', 10, True), fact('ae-1', 40, False), fact('if-1', 10, True)],
+     {'ae-1': ([10], 40), 'if-1': ([10], None)}),
+    # not an interface of the switch pair
+    ([fact('other', 10, True)],
+     {}),
+])
+def test_44_fold_interface_vlan_facts(rows, expected):
+    vlan_facts, folded_count = fold_interface_vlan_facts(rows, HOSTED, EVPN)
+    assert folded_count == len([x for x in rows if x['interface']['id'] != 'other'])
+    assert {k: (v['tagged'].to_list(), v['untagged']) for k, v in vlan_facts.items()} == expected
+
+
+def test_45_pull_interface_ownership(fake_bp, fake_session):
+    def row(system_label, interface_id, if_name, evpn_id=None):
+        return {
+            'switch': {'label': system_label},
+            'interface': {'id': interface_id, 'if_name': if_name},
+            'evpn-interface': {'id': evpn_id} if evpn_id else None,
+        }
+    rows = [
+        row('tor-a', 'if-1', 'xe-0/0/1'),
+        row('tor-a', 'if-3a', 'xe-0/0/3', 'ae-1'),
+        row('tor-b', 'if-3b', 'xe-0/0/3', 'ae-1'),
+        row('tor-b', 'if-4b', 'xe-0/0/4', 'ae-1'),
+    ]
+    fake_session.route('POST', '/qe', lambda body: {'items': rows})
+    hosted_interfaces, evpn_members = pull_interface_ownership(fake_bp, ['tor-a', 'tor-b'])
+    assert hosted_interfaces == {
+        'if-1': ('tor-a', 'xe-0/0/1'),
+        'if-3a': ('tor-a', 'xe-0/0/3'),
+        'if-3b': ('tor-b', 'xe-0/0/3'),
+        'if-4b': ('tor-b', 'xe-0/0/4'),
+    }
+    assert evpn_members == {'ae-1': {'tor-a': {'xe-0/0/3'}, 'tor-b': {'xe-0/0/3', 'xe-0/0/4'}}}
+
+
+def test_46_update_interface_id(fake_bp, fake_session):
+    interface_vlan_table = {
+        'tor-a': {
+            'xe-0/0/1': {CkEnum.TAGGED_VLANS: CkVlanSet([10]), CkEnum.UNTAGGED_VLAN: None},
+        },
+        CkEnum.REDUNDANCY_GROUP: {
+            'tor-ae-1': {
+                CkEnum.TAGGED_VLANS: CkVlanSet([20]),
+                CkEnum.UNTAGGED_VLAN: 30,
+                CkEnum.MEMBER_INTERFACE: {'tor-a': ['xe-0/0/3'], 'tor-b': ['xe-0/0/3']},
+            },
+        },
+    }
+    original = copy.deepcopy(interface_vlan_table)
+
+    def row(system_label, interface_id, if_name, evpn_id=None):
+        return {
+            'switch': {'label': system_label},
+            'member-interface': {'id': interface_id, 'if_name': if_name},
+            'evpn-interface': {'id': evpn_id} if evpn_id else None,
+        }
+    rows = [
+        row('tor-a', 'main-if-1', 'xe-0/0/1'),
+        row('tor-a', 'main-if-3a', 'xe-0/0/3', 'main-ae-1'),
+        row('tor-b', 'main-if-3b', 'xe-0/0/3', 'main-ae-1'),
+    ]
+    fake_session.route('POST', '/qe', lambda body: {'items': rows})
+    updated = update_interface_id(fake_bp, interface_vlan_table, ['tor-a', 'tor-b'])
+    assert updated['tor-a']['xe-0/0/1']['id'] == 'main-if-1'
+    assert updated[CkEnum.REDUNDANCY_GROUP]['tor-ae-1']['id'] == 'main-ae-1'
+    # the rows of the input are not changed, nor shared
+    assert interface_vlan_table == original
+    updated[CkEnum.REDUNDANCY_GROUP]['tor-ae-1'][CkEnum.TAGGED_VLANS].add(21)
+    updated[CkEnum.REDUNDANCY_GROUP]['tor-ae-1'][CkEnum.MEMBER_INTERFACE]['tor-a'].append('xe-0/0/4')
+    assert interface_vlan_table == original
+
+
+@pytest.mark.parametrize('desired, current, expected_changes, expected_unchanged', [
+    # new interface
+    ({'if-1': ['ct-10', 'ct-11']}, {}, {'if-1': (['ct-10', 'ct-11'], [])}, 0),
+    # already attached
+    ({'if-1': ['ct-10']}, {'if-1': {'ct-10'}}, {}, 1),
+    # add one, remove a stale single VLAN CT, keep the other CT
+    ({'if-1': ['ct-10', 'ct-11']}, {'if-1': {'ct-10', 'ct-12', 'ct-other'}}, {'if-1': (['ct-11'], ['ct-12'])}, 0),
+    # nothing desired any more
+    ({'if-1': []}, {'if-1': {'ct-12', 'ct-10'}}, {'if-1': ([], ['ct-10', 'ct-12'])}, 0),
+])
+def test_48_diff_interface_cts(desired, current, expected_changes, expected_unchanged):
+    single_vlan_ct_ids = {'ct-10', 'ct-11', 'ct-12'}
+    changes, unchanged_count = diff_interface_cts(desired, current, single_vlan_ct_ids)
+    assert changes == expected_changes
+    assert unchanged_count == expected_unchanged
@@ -0,0 +1,85 @@
+import pytest
+
+from apstra_bp_consolidation import apstra_blueprint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(apstra_blueprint.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(apstra_blueprint.time, 'sleep', clock.sleep)
+    return clock
+
+
+def route_version(fake_session, versions):
+    """
+    Answer diff-status with the staging versions in turn, then the last one
+    """
+    def diff_status(body):
+        version = versions.pop(0) if len(versions) > 1 else versions[0]
+        return {'staging_version': version}
+    fake_session.route('GET', '/diff-status', diff_status)
+
+
+def test_46_backoff_and_timeout(fake_bp, fake_session, clock):
+    route_version(fake_session, [1, 2, 3, 4, 5, 6, 7, 8])
+    checks = []
+    result = fake_bp.wait_for(lambda: checks.append(clock.now), timeout=1.0, initial_delay=0.1, max_delay=0.4)
+    assert result is None
+    assert clock.sleeps == [0.1, 0.2, 0.4, 0.3]
+    assert clock.now == pytest.approx(1.0)
+    assert len(checks) == 5
+
+
+def test_47_version_gated(fake_bp, fake_session, clock):
+    # the version does not change until the 4th probe
+    route_version(fake_session, [1, 1, 1, 2])
+    checks = []
+
+    def condition():
+        checks.append(clock.now)
+        return len(checks) == 2 and 'done'
+    assert fake_bp.wait_for(condition, timeout=10, initial_delay=0.1, max_delay=0.2, recheck_interval=100) == 'done'
+    # checked at the first probe and at the version change only
+    assert checks == [0.0, pytest.approx(0.5)]
+
+
+def test_48_recheck_at_same_version(fake_bp, fake_session, clock):
+    route_version(fake_session, [1])
+    checks = []
+
+    def condition():
+        checks.append(clock.now)
+        return clock.now >= 1.0
+    assert fake_bp.wait_for(condition, timeout=10, initial_delay=0.1, max_delay=0.4)
+    # rechecked every max_delay at most although the version stays
+    assert all(b - a <= 0.4 + 1e-9 for a, b in zip(checks, checks[1:]))
+    assert checks[-1] >= 1.0
+
+    checks.clear()
+    fake_session.requests.clear()
+    assert fake_bp.wait_for(condition, version_gated=False)
+    assert fake_session.bodies('GET', '/diff-status') == []
+
+
+def test_49_wait_for_query(fake_bp, fake_session, clock):
+    route_version(fake_session, [1, 2, 3])
+    answers = [[], [], [{'system': {'id': 'sw1'}}]]
+    fake_session.route('POST', '/qe', lambda body: {'items': answers.pop(0)})
+    assert fake_bp.wait_for_query("node('system', name='system')", initial_delay=0.1) == [{'system': {'id': 'sw1'}}]
+    assert len(fake_session.bodies('POST', '/qe')) == 3
+    fake_session.route('POST', '/qe', lambda body: {'items': []})
+    assert fake_bp.wait_for_query("node('system', name='system')", timeout=1) is None